@@ -14,6 +14,8 @@ from database.mysql import MySQLDB
 from utils.client import KantekClient
 from utils.loghandler import TGChannelLogHandler
 from utils.pluginmgr import PluginManager
+from utils.scheduler import scheduler
+from utils.workers import hash_pool
 
 try:
     from config import spamwatch_host, spamwatch_token
@@ -96,9 +98,12 @@ async def main() -> None:
     await asyncio.wait([client.run_until_disconnected() for client in clients],
                        return_when=concurrent.futures.FIRST_COMPLETED)
 
+    scheduler.stop()
     db.disconnect()
     for client in clients:
         await client.disconnect()
+    await KantekClient.url_resolver.close()
+    hash_pool.shutdown()
 
     if spamwatch_host and spamwatch_token:
         client.sw = spamwatch.Client(spamwatch_token, host=spamwatch_host)
@@ -0,0 +1,147 @@
+"""In-memory snapshots of the autobahn blacklists."""
+import asyncio
+import logging
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterator, Mapping, Optional, Tuple,
+                    TypeVar, Union)
+
+import logzero
+
+try:
+    from config import blacklist_refresh_interval
+except ImportError:
+    blacklist_refresh_interval = 30
+
+if TYPE_CHECKING:
+    from database.mysql import MySQLDB
+
+logger: logging.Logger = logzero.logger
+
+BlacklistKey = Union[str, int]
+T = TypeVar('T')
+
+
+class BlacklistSnapshot(Mapping):
+    """A read only copy of one blacklist table.
+
+    Behaves like the dict returned by `AutobahnBlacklist.get_all`, mapping
+    the blacklisted string to its id, in the same order.
+
+    Attributes:
+        hex_type: The autobahn type of the blacklist
+        version: The version of the table this snapshot was loaded at
+    """
+
+    def __init__(self, hex_type: str, version: int, items: Dict[BlacklistKey, int]) -> None:
+        self.hex_type = hex_type
+        self.version = version
+        self._items = items
+        self._indices: Dict[Callable, Any] = {}
+
+    def index(self, builder: Callable[['BlacklistSnapshot'], T]) -> T:
+        """Return a lookup structure built from this snapshot.
+
+        The structure is built on first use and reused until the blacklist
+        changes, since a new version gets a new snapshot.
+
+        Args:
+            builder: Callable that takes the snapshot, usually a matcher class
+
+        Returns: The result of builder
+        """
+        index = self._indices.get(builder)
+        if index is None:
+            index = self._indices[builder] = builder(self)
+        return index
+
+    def __getitem__(self, key: BlacklistKey) -> int:
+        return self._items[key]
+
+    def __iter__(self) -> Iterator[BlacklistKey]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class BlacklistSnapshots:
+    """Keep every autobahn blacklist in memory and reload it when it changes.
+
+    Local changes through `AutobahnBlacklist.add_item`/`delete_item` reload the
+    table right away. Changes made by other processes are picked up by polling
+    the `blacklist_versions` table every `blacklist_refresh_interval` seconds,
+    so reading a snapshot never needs a round trip to the DB.
+    """
+
+    def __init__(self, db: 'MySQLDB') -> None:
+        self._db = db
+        self._snapshots: Dict[str, BlacklistSnapshot] = {}
+        self._indices: Dict[Tuple[Callable, Tuple[str, ...]], Tuple[Tuple, Any]] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+
+    async def load(self) -> None:
+        """Load all blacklists and start polling for changes."""
+        versions = await self._db.blacklist_versions.get_all()
+        for hex_type, table in self._db.ab_collection_map.items():
+            await self._load(hex_type, versions.get(table.name, 0))
+        if self._poll_task is None:
+            self._poll_task = asyncio.ensure_future(self._poll())
+
+    def stop(self) -> None:
+        """Stop polling for changes."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    def __getitem__(self, hex_type: str) -> BlacklistSnapshot:
+        return self._snapshots[hex_type]
+
+    def index(self, builder: Callable[..., T], *hex_types: str) -> T:
+        """Return a lookup structure built from several blacklists.
+
+        Like `BlacklistSnapshot.index` but rebuilt when any of the blacklists changes.
+
+        Args:
+            builder: Callable that takes one snapshot per hex type
+            *hex_types: The autobahn types of the blacklists
+
+        Returns: The result of builder
+        """
+        snapshots = tuple(self._snapshots[hex_type] for hex_type in hex_types)
+        key = (builder, hex_types)
+        cached = self._indices.get(key)
+        if cached is None or any(old is not new for old, new in zip(cached[0], snapshots)):
+            cached = self._indices[key] = (snapshots, builder(*snapshots))
+        return cached[1]
+
+    async def mark_changed(self, hex_type: str) -> None:
+        """Bump the version of a blacklist and reload it.
+
+        Args:
+            hex_type: The autobahn type of the blacklist
+
+        Returns: None
+        """
+        table = self._db.ab_collection_map[hex_type]
+        version = await self._db.blacklist_versions.bump(table.name)
+        await self._load(hex_type, version)
+
+    async def _load(self, hex_type: str, version: int) -> None:
+        table = self._db.ab_collection_map[hex_type]
+        items = await table.get_all()
+        self._snapshots[hex_type] = BlacklistSnapshot(hex_type, version, items)
+        logger.debug('Loaded %s v%s with %s items', table.name, version, len(items))
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(blacklist_refresh_interval)
+            try:
+                versions = await self._db.blacklist_versions.get_all()
+                for hex_type, table in self._db.ab_collection_map.items():
+                    version = versions.get(table.name, 0)
+                    snapshot = self._snapshots.get(hex_type)
+                    if snapshot is None or snapshot.version != version:
+                        await self._load(hex_type, version)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:  # pylint: disable = W0703
+                logger.error('Refreshing the blacklists failed: %s', err)
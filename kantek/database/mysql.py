@@ -1,20 +1,42 @@
 """Module containing all operations related to MySQL"""
 import asyncio
+import hashlib
 import json
-from typing import Dict, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import aiomysql
 import aiomysql.connection
 
 import config
+from database.banlist_index import BanlistIndex
+from database.blacklists import BlacklistSnapshot, BlacklistSnapshots
+from utils.caching import LRUCache
+from utils.resolver import ResolvedUrl
+
+try:
+    from config import db_pool_maxsize, db_pool_minsize
+except ImportError:
+    db_pool_minsize = 1
+    db_pool_maxsize = 10
+
+try:
+    from config import chat_cache_size
+except ImportError:
+    chat_cache_size = 10000
 
 
 class Chats:
-    """A table containing Telegram Chats"""
+    """A table containing Telegram Chats
+
+    Parsed chat documents are kept in a process wide cache that is updated
+    whenever the tags of a chat are written through `update_tags`.
+    """
     name = 'chats'
 
     def __init__(self, db: aiomysql.connection.Connection) -> None:
         self.db = db
+        self.cache = LRUCache(maxsize=chat_cache_size)
 
     async def create(self):
         await self.db.execute('''create table if not exists `{}` (
@@ -41,9 +63,7 @@ class Chats:
         sql = 'select * from `{}` where `id` = %s'.format(self.name)
         chat = await self.db.execute(sql, chat_id, fetch='one')
 
-        chat['tags'] = json.loads(chat['tags'])
-        chat['named_tags'] = json.loads(chat['named_tags'])
-        return chat
+        return self._cache_document(chat)
 
     async def get_chat(self, chat_id: int) -> Dict:
         """Return a Chat document
@@ -54,20 +74,87 @@ class Chats:
         Returns: The chat Document
 
         """
+        cached = self.cache.get(str(chat_id))
+        if cached is not None:
+            return self._copy_document(cached)
+
         sql = 'select * from `{}` where `id` = %s'.format(self.name)
         chat = await self.db.execute(sql, str(chat_id), fetch='one')
 
         if chat is None:
             return await self.add_chat(chat_id)
         else:
-            chat['tags'] = json.loads(chat['tags'])
-            chat['named_tags'] = json.loads(chat['named_tags'])
-            return chat
+            return self._cache_document(chat)
+
+    async def update_tags(self, chat_id: int, tags: List, named_tags: Dict) -> None:
+        """Write the tags of a chat to the DB and the cache.
+
+        Args:
+            chat_id: The id of the chat
+            tags: List of tags
+            named_tags: Dict of named tags
+
+        Returns: None
+
+        """
+        sql = 'update `{}` set `tags` = %s, `named_tags` = %s where `id` = %s'.format(self.name)
+        await self.db.execute(sql, json.dumps(tags), json.dumps(named_tags), chat_id)
+        await self.db.save()
+        self.cache.set(str(chat_id), {'id': str(chat_id), 'tags': list(tags),
+                                      'named_tags': dict(named_tags)})
+
+    def _cache_document(self, chat: Dict) -> Dict:
+        chat['tags'] = json.loads(chat['tags'])
+        chat['named_tags'] = json.loads(chat['named_tags'])
+        self.cache.set(str(chat['id']), chat)
+        return self._copy_document(chat)
+
+    @staticmethod
+    def _copy_document(chat: Dict) -> Dict:
+        # tag values are scalars so a shallow copy keeps callers from mutating the cache
+        return {'id': chat['id'], 'tags': list(chat['tags']),
+                'named_tags': dict(chat['named_tags'])}
+
+
+class BlacklistVersions:
+    """A table with a version counter for every blacklist, bumped on every change."""
+    name = 'blacklist_versions'
+
+    def __init__(self, db: aiomysql.connection.Connection) -> None:
+        self.db = db
+
+    async def create(self):
+        await self.db.execute('''create table if not exists `{}` (
+            `name` varchar(255) not null primary key,
+            `version` bigint not null
+        )'''.format(self.name))
+        await self.db.save()
+
+    async def bump(self, table_name: str) -> int:
+        """Increment the version of a table.
+
+        Args:
+            table_name: Name of the blacklist table
+
+        Returns: The new version
+        """
+        sql = 'insert into `{}` (`name`, `version`) values (%s, 1) ' \
+              'on duplicate key update `version` = `version` + 1'.format(self.name)
+        await self.db.execute(sql, table_name)
+        sql = 'select `version` from `{}` where `name` = %s'.format(self.name)
+        return (await self.db.execute(sql, table_name, fetch='one'))['version']
+
+    async def get_all(self) -> Dict[str, int]:
+        """Get the versions of all tables."""
+        sql = 'select * from `{}`'.format(self.name)
+        docs = await self.db.execute(sql, fetch='all')
+        return {doc['name']: doc['version'] for doc in docs}
 
 
 class AutobahnBlacklist:
     """Base class for all types of Blacklists."""
     name = None
+    hex_type = None
 
     def __init__(self, db: aiomysql.connection.Connection) -> None:
         self.db = db
@@ -91,6 +178,7 @@ class AutobahnBlacklist:
         sql = 'insert ignore into `{}` (`string`) values (%s)'.format(self.name)
         await self.db.execute(sql, item)
         await self.db.save()
+        await self.db.blacklists.mark_changed(self.hex_type)
 
         sql = 'select * from `{}` where `string` = %s'.format(self.name)
         return await self.db.execute(sql, item, fetch='one')
@@ -107,6 +195,7 @@ class AutobahnBlacklist:
         sql = 'delete from `{}` where `string` = %s'.format(self.name)
         await self.db.execute(sql, item)
         await self.db.save()
+        await self.db.blacklists.mark_changed(self.hex_type)
 
     async def get_item(self, item: str) -> Dict:
         """Get a Chat from the DB or return an existing one.
@@ -126,6 +215,11 @@ class AutobahnBlacklist:
         docs = await self.db.execute(sql, fetch='all')
         return {doc['string']: doc['id'] for doc in docs}
 
+    @property
+    def snapshot(self) -> BlacklistSnapshot:
+        """The in-memory copy of all items in the Blacklist."""
+        return self.db.blacklists[self.hex_type]
+
 
 class AutobahnBioBlacklist(AutobahnBlacklist):
     """Blacklist with strings in a bio."""
@@ -181,11 +275,16 @@ class AutobahnLinkPreviewBlacklist(AutobahnBlacklist):
 
 
 class BanList:
-    """A list of banned ids and their reason"""
+    """A list of banned ids and their reason
+
+    Lookups are answered from an in-memory `BanlistIndex` once it is loaded,
+    all writes have to go through this class to keep the index in sync.
+    """
     name = 'banlist'
 
     def __init__(self, db: aiomysql.connection.Connection):
         self.db = db
+        self.index = BanlistIndex()
 
     async def create(self):
         await self.db.execute('''create table if not exists `{}` (
@@ -194,40 +293,215 @@ class BanList:
         )'''.format(self.name))
         await self.db.save()
 
+    async def load_index(self) -> None:
+        """Load all bans into the in-memory index."""
+        await self.index.load(self.db)
+
     async def add_user(self, _id: int, reason: str) -> Dict:
-        """Add a Chat to the DB or return an existing one.
+        """Add a User to the banlist or update the reason of an existing ban.
 
         Args:
             _id: The id of the User
             reason: The ban reason
 
-        Returns: The chat Document
+        Returns: The ban Document
 
         """
-        sql = 'insert ignore into `{}` (`id`, `string`) values (%s, %s)'.format(self.name)
-        await self.db.execute(sql, _id, reason)
+        sql = 'insert into `{}` (`id`, `ban_reason`) values (%s, %s) ' \
+              'on duplicate key update `ban_reason` = %s'.format(self.name)
+        await self.db.execute(sql, _id, reason, reason)
         await self.db.save()
+        self.index.add(int(_id), reason)
+        return {'id': int(_id), 'ban_reason': reason}
 
-        sql = 'select * from `{}` where `id` = %s'.format(self.name)
-        return await self.db.execute(sql, _id, fetch='one')
+    async def add_users(self, bans: List[Tuple[int, str]]) -> None:
+        """Add many Users to the banlist in one transaction.
+
+        Args:
+            bans: Tuples of user id and ban reason
+
+        Returns: None
+
+        """
+        # aiomysql only sends the rows together when the statement has no parameters after
+        # the values, so the update refers to the inserted values instead of repeating them
+        sql = 'insert into `{}` (`id`, `ban_reason`) values (%s, %s) ' \
+              'on duplicate key update `ban_reason` = values(`ban_reason`)'.format(self.name)
+        async with self.db.transaction() as tx:
+            await tx.executemany(sql, [(uid, reason) for uid, reason in bans])
+        self.index.add_many((int(uid), reason) for uid, reason in bans)
+
+    async def delete_user(self, uid: int) -> None:
+        """Remove a User from the banlist.
+
+        Args:
+            uid: The id of the User
+
+        Returns: None
+
+        """
+        sql = 'delete from `{}` where `id` = %s'.format(self.name)
+        await self.db.execute(sql, uid)
+        await self.db.save()
+        self.index.remove(int(uid))
 
     async def get_user(self, uid: int) -> Optional[Dict]:
+        if self.index.loaded:
+            try:
+                reason = self.index.get(int(uid))
+            except ValueError:
+                return None
+            return {'id': int(uid), 'ban_reason': reason} if reason is not None else None
         sql = 'select * from `{}` where `id` = %s'.format(self.name)
         return await self.db.execute(sql, str(uid), fetch='one')
 
 
+class UrlCache:
+    """Results of following the redirects of a url, shared between sessions and restarts."""
+    name = 'url_cache'
+
+    def __init__(self, db: aiomysql.connection.Connection):
+        self.db = db
+
+    async def create(self):
+        await self.db.execute('''create table if not exists `{}` (
+            `url_hash` char(64) not null primary key,
+            `url` text not null,
+            `resolved_url` text not null,
+            `chain` text not null,
+            `base_domain` varchar(255) not null,
+            `expires` int not null
+        )'''.format(self.name))
+        sql = 'delete from `{}` where `expires` < unix_timestamp()'.format(self.name)
+        await self.db.execute(sql)
+        await self.db.save()
+
+    async def get(self, url: str) -> Optional[ResolvedUrl]:
+        """Get the resolved url if the entry didn't expire yet.
+
+        Args:
+            url: The url as it was passed to resolve_url
+
+        Returns: The resolved url or None
+        """
+        sql = 'select `resolved_url`, `chain`, `base_domain` from `{}` ' \
+              'where `url_hash` = %s and `expires` > unix_timestamp()'.format(self.name)
+        row = await self.db.execute(sql, self._hash(url), fetch='one')
+        if row is None:
+            return None
+        return ResolvedUrl(row['resolved_url'], json.loads(row['chain']), row['base_domain'])
+
+    async def set(self, url: str, resolved: ResolvedUrl, ttl: int) -> None:
+        """Store the result of resolving a url.
+
+        Args:
+            url: The url as it was passed to resolve_url
+            resolved: The resolved url
+            ttl: Seconds until the entry expires
+
+        Returns: None
+        """
+        sql = 'insert into `{}` (`url_hash`, `url`, `resolved_url`, `chain`, `base_domain`, ' \
+              '`expires`) values (%s, %s, %s, %s, %s, unix_timestamp() + %s) ' \
+              'on duplicate key update `resolved_url` = values(`resolved_url`), ' \
+              '`chain` = values(`chain`), `base_domain` = values(`base_domain`), ' \
+              '`expires` = values(`expires`)'.format(self.name)
+        await self.db.execute(sql, self._hash(url), url, resolved.url, json.dumps(resolved.chain),
+                              resolved.base_domain, ttl)
+        await self.db.save()
+
+    @staticmethod
+    def _hash(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+
+class FileHashes:
+    """Hashes of Telegram documents so a known document doesn't have to be downloaded again."""
+    name = 'file_hashes'
+
+    def __init__(self, db: aiomysql.connection.Connection):
+        self.db = db
+
+    async def create(self):
+        await self.db.execute('''create table if not exists `{}` (
+            `document_id` bigint not null,
+            `size` bigint not null,
+            `dc_id` int not null,
+            `hash` char(128) not null,
+            primary key (`document_id`, `size`, `dc_id`)
+        )'''.format(self.name))
+        await self.db.save()
+
+    async def get(self, document_id: int, size: int, dc_id: int) -> Optional[str]:
+        """Get the hash of a document.
+
+        Args:
+            document_id: The id of the Telegram document
+            size: The size of the document
+            dc_id: The datacenter the document is stored in
+
+        Returns: The hash or None
+        """
+        sql = 'select `hash` from `{}` where `document_id` = %s and `size` = %s ' \
+              'and `dc_id` = %s'.format(self.name)
+        row = await self.db.execute(sql, document_id, size, dc_id, fetch='one')
+        return row['hash'] if row else None
+
+    async def set(self, document_id: int, size: int, dc_id: int, file_hash: str) -> None:
+        """Store the hash of a document.
+
+        Args:
+            document_id: The id of the Telegram document
+            size: The size of the document
+            dc_id: The datacenter the document is stored in
+            file_hash: The hash as returned by helpers.hash_file
+
+        Returns: None
+        """
+        sql = 'insert ignore into `{}` (`document_id`, `size`, `dc_id`, `hash`) ' \
+              'values (%s, %s, %s, %s)'.format(self.name)
+        await self.db.execute(sql, document_id, size, dc_id, file_hash)
+        await self.db.save()
+
+
+class Transaction:
+    """A connection checked out from the pool for the duration of a transaction.
+
+    Statements executed through it are committed together when the
+    transaction scope is left and rolled back if it raises.
+    """
+
+    def __init__(self, conn: aiomysql.connection.Connection) -> None:
+        self._conn = conn
+
+    async def execute(self, stmt, *values, fetch=False):
+        async with self._conn.cursor() as cursor:
+            await cursor.execute(stmt, values)
+
+            if fetch == 'all':
+                return await cursor.fetchall()
+            elif fetch == 'one':
+                return await cursor.fetchone()
+
+    async def executemany(self, stmt, values):
+        async with self._conn.cursor() as cursor:
+            await cursor.executemany(stmt, values)
+
+
 class MySQLDB:
     """Handle creation of all required Documents."""
 
     def __init__(self):
         self._lock = asyncio.Lock()
-        self._db = None
+        self._pool: Optional[aiomysql.Pool] = None
         self.ab_collection_map = {}
+        self.blacklists: Optional[BlacklistSnapshots] = None
 
     async def connect(self):
-        self._db = await aiomysql.connect(host=config.db_host, user=config.db_username,
-                                          password=config.db_password, db=config.db_name,
-                                          cursorclass=aiomysql.DictCursor)
+        self._pool = await aiomysql.create_pool(host=config.db_host, user=config.db_username,
+                                                password=config.db_password, db=config.db_name,
+                                                minsize=db_pool_minsize, maxsize=db_pool_maxsize,
+                                                autocommit=True, cursorclass=aiomysql.DictCursor)
 
         await self._create_tables()
         self.ab_collection_map = {
@@ -241,6 +515,9 @@ class MySQLDB:
             '0x7': self.ab_tld_blacklist,
             '0x8': self.ab_linkpreview_blacklist
         }
+        self.blacklists = BlacklistSnapshots(self)
+        await self.blacklists.load()
+        await self.banlist.load_index()
 
     async def _create_tables(self):
         self.groups = await self._get_table(Chats)
@@ -254,27 +531,81 @@ class MySQLDB:
         self.ab_tld_blacklist = await self._get_table(AutobahnTLDBlacklist)
         self.ab_linkpreview_blacklist = await self._get_table(AutobahnLinkPreviewBlacklist)
         self.banlist = await self._get_table(BanList)
+        self.blacklist_versions = await self._get_table(BlacklistVersions)
+        self.url_cache = await self._get_table(UrlCache)
+        self.file_hashes = await self._get_table(FileHashes)
 
     async def save(self):
-        async with self._lock:
-            await self._db.commit()
+        """Kept for compatibility, statements outside of a transaction are autocommitted."""
 
     async def execute(self, stmt, *values, fetch=False):
-        async with self._lock:
-            cursor = await self._db.cursor()
+        """Execute a single statement on a connection checked out from the pool.
 
-            try:
+        Args:
+            stmt: The SQL statement
+            *values: Values for the placeholders in the statement
+            fetch: 'one' or 'all' to return the result rows
+
+        Returns: The fetched row(s) if fetch is set
+        """
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cursor:
                 await cursor.execute(stmt, values)
 
                 if fetch == 'all':
                     return await cursor.fetchall()
                 elif fetch == 'one':
                     return await cursor.fetchone()
-            finally:
-                await cursor.close()
+
+    async def stream(self, stmt, *values, size=1000) -> AsyncIterator[Tuple[Any, ...]]:
+        """Iterate over a large result without holding all rows in memory.
+
+        Rows are fetched from an unbuffered cursor in batches of `size` and
+        returned as tuples instead of dicts.
+
+        Args:
+            stmt: The SQL statement
+            *values: Values for the placeholders in the statement
+            size: Number of rows fetched at once
+
+        Returns: An async iterator over the rows
+        """
+        async with self._pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cursor:
+                await cursor.execute(stmt, values)
+                while True:
+                    rows = await cursor.fetchmany(size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Transaction]:
+        """Run several statements on one connection and commit them together.
+
+        Transactions are serialized so concurrent bulk writes don't deadlock each other,
+        single statements through `execute` are not affected by this.
+
+        Examples:
+            async with db.transaction() as tx:
+                await tx.executemany(sql, rows)
+        """
+        async with self._lock:
+            async with self._pool.acquire() as conn:
+                await conn.begin()
+                try:
+                    yield Transaction(conn)
+                except BaseException:
+                    await conn.rollback()
+                    raise
+                else:
+                    await conn.commit()
 
     def disconnect(self):
-        self._db.close()
+        if self.blacklists is not None:
+            self.blacklists.stop()
+        self._pool.close()
 
     async def _get_table(self, table):
         """Return a table or create it if it doesn't exist yet.
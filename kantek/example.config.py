@@ -1,5 +1,5 @@
 """File containing the settings for kantek."""
-from typing import List, Union
+from typing import List, Optional, Union
 
 api_id: Union[str, int] = ''
 api_hash: str = ''
@@ -27,6 +27,58 @@ db_username = 'kantek'
 db_name = 'kantek'
 db_password = 'PASSWORD'
 db_host = 'localhost'
+# Number of pooled connections, every query checks out its own connection
+db_pool_minsize: int = 1
+db_pool_maxsize: int = 10
+# Number of parsed chat documents kept in memory
+chat_cache_size: int = 10000
+# Seconds between checks if another process changed a blacklist
+blacklist_refresh_interval: int = 30
+
+# Cache for the results of following redirects
+url_cache_size: int = 10000
+url_cache_ttl: int = 6 * 60 * 60
+# Failed lookups are retried after this many seconds
+url_cache_negative_ttl: int = 5 * 60
+# Also store results in the DB to share them between sessions and restarts
+url_cache_persistent: bool = False
+# 'head' follows redirects with HEAD requests without downloading any page,
+# 'get' uses plain GET requests like older versions
+url_resolver: str = 'head'
+
+# Hashes of already checked documents, keyed by their Telegram id
+file_hash_cache_size: int = 10000
+file_hash_cache_persistent: bool = False
+# Documents above this size in bytes are not checked against the file blacklist, None checks all
+max_file_check_size: Optional[int] = 50 * 1024 ** 2
+# Media hashes of already checked photos, keyed by their Telegram id
+photo_hash_cache_size: int = 10000
+# Admin ids of chats, refetched after admin_cache_ttl seconds or when an admin changes or leaves
+admin_cache_size: int = 10000
+admin_cache_ttl: int = 10 * 60
+# Seconds to collect messages of a chat before deleting them with a single request
+deletion_window: float = 0.5
+# Seconds updates of a user that was just banned from a chat are ignored
+recent_ban_ttl: int = 5 * 60
+# Workers and queue of the automatic plugins like polizei and grenzschutz
+scheduler_workers: int = 16
+scheduler_queue_size: int = 1000
+# What to drop when the queue is full: 'oldest' drops queued jobs of the least important
+# kind, 'newest' drops new jobs
+scheduler_shedding: str = 'oldest'
+# Seconds polizei may spend checking a single message, None for no limit.
+# The file and photo checks always run and aren't limited, they are bound by max_file_check_size
+polizei_check_budget: Optional[float] = 10
+# Photo size used for media hashes: 'full', 'small' or 'stripped'
+# Check with .calibrate how well the smaller sizes match the full size before changing this
+photo_hash_size: str = 'full'
+# Decode JPEGs at a reduced size of at least this many pixels before hashing them, None decodes
+# the full photo. Faster, but changes some hashes. Check with .calibrate before enabling this
+photo_hash_draft_size: Optional[int] = None
+# Processes used to hash photos, None uses one per CPU. Started on first use
+hash_workers: Optional[int] = None
+# Maximum number of photos handed to the hash processes at once
+hash_queue_size: int = 64
 
 # Optional
 # if these options are empty the feature will be disabled.
@@ -2,22 +2,20 @@
 import asyncio
 import json
 import logging
-import os
 import re
 from collections import Counter
 
 import logzero
-from telethon import events
 from telethon.errors import MessageIdInvalidError
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
 
-from config import cmd_prefix
 from database.mysql import MySQLDB
-from utils import constants, helpers, parsers
+from utils import constants, helpers
 from utils.client import KantekClient
 from utils.mdtex import (Bold, Code, KeyValueItem, MDTeXDocument, Pre, Section,
                          SubSection)
+from utils.router import command
 
 __version__ = '0.2.1'
 
@@ -40,13 +38,12 @@ AUTOBAHN_TYPES = {
 INVITELINK_PATTERN = re.compile(r'(?:joinchat|join)(?:/|\?invite=)(.*|)')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}a(uto)?b(ahn)?'))
+@command('autobahn', 'ab')
 async def autobahn(event: NewMessage.Event) -> None:
     """Command to manage autobahn blacklists"""
     client: KantekClient = event.client
-    msg: Message = event.message
     db: MySQLDB = client.db
-    args = msg.raw_text.split()[1:]
+    keyword_args, args = await helpers.get_args(event)
 
     response = ''
     if not args:
@@ -56,7 +53,7 @@ async def autobahn(event: NewMessage.Event) -> None:
         response = await _add_item(event, db)
     elif args[0] == 'del' and len(args) > 1:
         response = await _del_item(event, db)
-    elif args[0] == 'query' and len(args) > 1:
+    elif args[0] == 'query' and (len(args) > 1 or keyword_args):
         response = await _query_item(event, db)
     if response:
         await client.respond(event, response)
@@ -82,8 +79,7 @@ async def _add_item(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
     """Add an item to the Collection of its type"""
     client: KantekClient = event.client
     msg: Message = event.message
-    args = msg.raw_text.split()[2:]
-    keyword_args, args = parsers.parse_arguments(' '.join(args))
+    keyword_args, args = await helpers.get_subcommand_args(event)
     item_type = args[0]
     items = args[1:]
     domains = keyword_args.get('domains')
@@ -145,13 +141,12 @@ async def _add_item(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
     if not items and hex_type == '0x5':
         if msg.is_reply:
             reply_msg: Message = await msg.get_reply_message()
-            if reply_msg.file:
+            if reply_msg.document:
                 await msg.edit('Downloading file, this may take a while.')
 
-                dl_filename = await reply_msg.download_media('tmp/blacklisted_file',
-                                                             progress_callback=lambda r, t: _sync_file_callback(r, t, msg))
-                file_hash = await helpers.hash_file(dl_filename)
-                os.remove(dl_filename)
+                file_hash = await client.get_file_hash(
+                    reply_msg.document,
+                    progress_callback=lambda r, t: _sync_file_callback(r, t, msg))
                 await msg.delete()
                 existing_one = await collection.get_item(file_hash)
 
@@ -171,8 +166,7 @@ async def _add_item(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
             if reply_msg.photo:
                 await msg.edit('Hashing photo, this may take a moment.')
 
-                dl_photo = await reply_msg.download_media(bytes)
-                photo_hash = await helpers.hash_photo(dl_photo)
+                photo_hash = await client.get_photo_hash(reply_msg.photo)
                 await msg.delete()
                 existing_one = await collection.get_item(photo_hash)
 
@@ -207,9 +201,7 @@ async def _add_item(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
 
 async def _del_item(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
     """Add an item to the Collection of its type"""
-    msg: Message = event.message
-    args = msg.raw_text.split()[2:]
-    _, args = parsers.parse_arguments(' '.join(args))
+    _, args = await helpers.get_subcommand_args(event)
     item_type = args[0]
     items = args[1:]
     removed_items = []
@@ -235,9 +227,7 @@ async def _del_item(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
 
 async def _query_item(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
     """Add an item to the Collection of its type"""
-    msg: Message = event.message
-    args = msg.raw_text.split()[2:]
-    keyword_args, args = parsers.parse_arguments(' '.join(args))
+    keyword_args, args = await helpers.get_subcommand_args(event)
     if 'types' in args:
         return MDTeXDocument(Section(
             Bold('Types'),
@@ -7,16 +7,15 @@ from typing import List
 
 import pymysql
 from spamwatch.types import Ban, Permission
-from telethon import events
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
 
-from config import cmd_prefix
 from database.mysql import MySQLDB
-from utils import helpers, parsers
+from utils import helpers
 from utils.client import KantekClient
 from utils.mdtex import (Bold, Code, Italic, KeyValueItem, MDTeXDocument,
                          Section)
+from utils.router import command
 
 __version__ = '0.2.0'
 
@@ -24,13 +23,12 @@ tlog = logging.getLogger('kantek-channel-log')
 
 SWAPI_SLICE_LENGTH = 50
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}b(an)?l(ist)?'))
+@command('banlist', 'bl')
 async def banlist(event: NewMessage.Event) -> None:
     """Command to query and manage the banlist."""
     client: KantekClient = event.client
-    msg: Message = event.message
     db: MySQLDB = client.db
-    args = msg.raw_text.split()[1:]
+    _, args = await helpers.get_args(event)
     response = ''
     if not args:
         pass
@@ -49,9 +47,7 @@ async def banlist(event: NewMessage.Event) -> None:
 
 
 async def _query_banlist(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument:
-    msg: Message = event.message
-    args = msg.raw_text.split()[2:]
-    keyword_args, args = parsers.parse_arguments(' '.join(args))
+    keyword_args, args = await helpers.get_subcommand_args(event)
     reason = keyword_args.get('reason')
     users = []
     if args:
@@ -85,13 +81,7 @@ async def _import_banlist(event: NewMessage.Event, db: MySQLDB) -> MDTeXDocument
             start_time = time.time()
             _banlist = await helpers.rose_csv_to_dict(filename)
             if _banlist:
-                sql = 'insert into `banlist` (`id`, `ban_reason`) values (%s, %s)' \
-                      'on duplicate key update `ban_reason` = %s'
-
-                for ban in _banlist:
-                    await db.execute(sql, ban['id'], ban['reason'], ban['id'])
-
-                await db.save()
+                await db.banlist.add_users([(ban['id'], ban['reason']) for ban in _banlist])
 
                 if client.sw and client.sw.permission in [Permission.Admin, Permission.Root]:
                     bans = {}
@@ -5,7 +5,6 @@ import logging
 from typing import Dict, Optional, List
 
 import logzero
-from telethon import events
 from telethon.errors import MessageIdInvalidError
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
@@ -13,10 +12,11 @@ from telethon.tl.functions.channels import EditBannedRequest
 from telethon.tl.functions.messages import ReportRequest
 from telethon.tl.types import Channel, InputReportReasonSpam, ChatBannedRights
 
-from config import cmd_prefix, gban_group
+from config import gban_group
 from utils import helpers
 from utils.client import KantekClient
 from utils.mdtex import MDTeXDocument, Section, KeyValueItem, Bold, Code
+from utils.router import command
 
 __version__ = '0.4.0'
 
@@ -27,7 +27,7 @@ DEFAULT_REASON = 'spam[gban]'
 CHUNK_SIZE = 10
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}gban'))
+@command('gban')
 async def gban(event: NewMessage.Event) -> None:
     """Command to globally ban a user."""
 
@@ -129,7 +129,7 @@ def _build_message(bans: Dict[str, List[str]]) -> List[KeyValueItem]:
     return sections
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}ungban'))
+@command('ungban')
 async def ungban(event: NewMessage.Event) -> None:
     """Command to globally unban a user."""
     msg: Message = event.message
@@ -6,15 +6,18 @@ import logzero
 from telethon import events
 from telethon.errors import UserIdInvalidError
 from telethon.events import ChatAction, NewMessage
-from telethon.tl.types import Channel, ChannelParticipantsAdmins
+from telethon.tl.types import Channel
 
 import config
 from database.mysql import MySQLDB
 from utils.client import KantekClient
+from utils.context import EventContext
+from utils.coordinator import event_key
 from utils.mdtex import (Bold, Code, KeyValueItem, MDTeXDocument, Mention,
                          Section)
+from utils.scheduler import Priority, scheduled
 
-__version__ = '0.1.1'
+__version__ = '0.1.3'
 
 tlog = logging.getLogger('kantek-channel-log')
 logger: logging.Logger = logzero.logger
@@ -22,52 +25,58 @@ logger: logging.Logger = logzero.logger
 
 @events.register(events.chataction.ChatAction())
 @events.register(events.NewMessage())
+@scheduled(Priority.BANLIST)
 async def grenzschutz(event: Union[ChatAction.Event, NewMessage.Event]) -> None:
     """Plugin to ban blacklisted users."""
     if event.is_private:
         return
     client: KantekClient = event.client
-    chat: Channel = await event.get_chat()
+    context = EventContext.of(event)
+    chat: Channel = await context.get_chat()
     if not chat.creator and not chat.admin_rights:
         return
     if chat.admin_rights:
         if not chat.admin_rights.ban_users:
             return
     db: MySQLDB = client.db
-    chat_document = await db.groups.get_chat(event.chat_id)
-    db_named_tags: Dict = chat_document['named_tags']
+    db_named_tags: Dict = (await context.get_tags()).named_tags
     polizei_tag = db_named_tags.get('polizei')
     grenzschutz_tag = db_named_tags.get('grenzschutz')
     verbose = grenzschutz_tag == 'verbose'
     if grenzschutz_tag == 'exclude' or polizei_tag == 'exclude':
         return
 
-    if isinstance(event, ChatAction.Event):
-        uid = event.user_id
-    elif isinstance(event, NewMessage.Event):
-        uid = event.message.from_id
-    else:
-        return
+    uid = context.sender_id
     if uid is None:
         return
-    try:
-        user = await client.get_cached_entity(uid)
-    except ValueError as err:
-        logger.error(err)
-
+    if (client.bans.recently_banned(event.chat_id, uid)
+            or client.bans.in_progress(event.chat_id, uid)):
+        return
+    # only one of the sessions that can ban in this chat handles the update
+    if not client.coordinator.claim('grenzschutz', event_key(event)):
+        return
     banned_user = await db.banlist.get_user(uid)
     if not banned_user:
         return
     else:
         ban_reason = banned_user['ban_reason']
 
-    admins = [p.id for p in (await client.get_participants(event.chat_id, filter=ChannelParticipantsAdmins()))]
-    if uid not in admins:
+    if not await context.is_admin() and client.bans.begin(event.chat_id, uid):
+        user = await context.get_sender()
+        banned = False
         try:
             await client.ban(chat, uid)
+            banned = True
         except UserIdInvalidError as err:
             logger.error(f"Error occured while banning {err}")
             return
+        finally:
+            deferred = client.bans.finish(event.chat_id, uid, banned)
+            if deferred and banned:
+                client.deletions.delete(chat, deferred)
+            elif deferred:
+                logger.warning('Banning %s in %s failed, keeping %s messages sent meanwhile',
+                               uid, event.chat_id, len(deferred))
 
         message = MDTeXDocument(Section(
             Bold('SpamWatch Grenzschutz Ban'),
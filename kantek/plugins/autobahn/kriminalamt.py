@@ -2,7 +2,7 @@
 import asyncio
 import datetime
 import logging
-from typing import Dict
+from typing import Dict, Optional
 
 import logzero
 from telethon import events
@@ -13,10 +13,11 @@ from telethon.tl.functions.channels import (DeleteUserHistoryRequest,
                                             GetParticipantRequest)
 from telethon.tl.types import Channel, ChatBannedRights, User
 
-from database.mysql import MySQLDB
 from utils.client import KantekClient
+from utils.context import EventContext
+from utils.scheduler import Priority, scheduled
 
-__version__ = '0.1.0'
+__version__ = '0.1.1'
 
 tlog = logging.getLogger('kantek-channel-log')
 logger: logging.Logger = logzero.logger
@@ -24,12 +25,9 @@ logger: logging.Logger = logzero.logger
 
 @events.register(events.ChatAction())
 async def kriminalamt(event: ChatAction.Event) -> None:
-    client: KantekClient = event.client
-    chat: Channel = await event.get_chat()
-    user: User = await event.get_user()
-    db: MySQLDB = client.db
-    chat_document = await db.groups.get_chat(event.chat_id)
-    db_named_tags: Dict = chat_document['named_tags']
+    context = EventContext.of(event)
+    user: User = await context.get_sender()
+    db_named_tags: Dict = (await context.get_tags()).named_tags
     kriminalamt_tag = db_named_tags.get('kriminalamt')
     bancmd = db_named_tags.get('gbancmd', 'manual')
     delay = 1
@@ -40,7 +38,16 @@ async def kriminalamt(event: ChatAction.Event) -> None:
     elif isinstance(kriminalamt_tag, str) and kriminalamt_tag.isdigit():
         delay = int(kriminalamt_tag)
     await asyncio.sleep(delay)
+    # only the check runs in the scheduler so waiting doesn't take up a worker
+    await _check_participant(event, delay, bancmd)
+
 
+@scheduled(Priority.JOIN)
+async def _check_participant(event: ChatAction.Event, delay: int, bancmd: Optional[str]) -> None:
+    client: KantekClient = event.client
+    context = EventContext.of(event)
+    chat: Channel = await context.get_chat()
+    user: User = await context.get_sender()
     try:
         await client(GetParticipantRequest(chat, user))
     except UserNotParticipantError:
@@ -63,5 +70,5 @@ async def kriminalamt(event: ChatAction.Event) -> None:
             messages = await client.get_messages(chat, from_user=userid, limit=0)
             if messages.total <= 5:
                 await client(DeleteUserHistoryRequest(chat, userid))
-            else:
-                await event.delete()
+            elif event.action_message is not None:
+                client.deletions.delete(chat, [event.action_message.id])
@@ -1,106 +1,188 @@
 """Plugin that automatically bans according to a blacklist"""
 import asyncio
 import datetime
+import functools
 import itertools
-import json
 import logging
 import os
 import uuid
-from typing import Dict
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
 
 import logzero
-from photohash import hashes_are_similar
 from telethon import events
 from telethon.events import ChatAction, NewMessage
 from telethon.tl.custom import Message, MessageButton
 from telethon.tl.functions.channels import (DeleteUserHistoryRequest,
                                             EditBannedRequest)
 from telethon.tl.functions.users import GetFullUserRequest
-from telethon.tl.types import (Channel, ChannelParticipantsAdmins,
-                               ChatBannedRights, MessageEntityMention,
+from telethon.tl.types import (Channel, ChatBannedRights, MessageEntityMention,
                                MessageEntityTextUrl, MessageEntityUrl, Photo,
-                               UserFull)
+                               TypeMessageEntity, UserFull)
 
 from database.mysql import MySQLDB
 from utils import constants, helpers
 from utils.client import KantekClient
-from utils.helpers import hash_photo
+from utils.context import EventContext
+from utils.coordinator import EventKey, event_key
+from utils.matchers import AhoCorasick, BKTree, DomainTrie, LinkPreviewIndex
+from utils.pipeline import Cost, Pipeline
+from utils.scheduler import Priority, scheduled
 
-__version__ = '0.4.1'
+__version__ = '0.5.3'
 
 tlog = logging.getLogger('kantek-channel-log')
 logger: logging.Logger = logzero.logger
 
+try:
+    from config import max_file_check_size
+except ImportError:
+    max_file_check_size = (1024 ** 2) * 50
+
+try:
+    from config import polizei_check_budget
+except ImportError:
+    polizei_check_budget = 10
+
+# maximum number of urls and entities of a message resolved at the same time
+RESOLVE_CONCURRENCY = 4
+
 
 @events.register(events.MessageEdited(outgoing=False))
 @events.register(events.NewMessage(outgoing=False))
+@scheduled(Priority.CONTENT)
 async def polizei(event: NewMessage.Event) -> None:
     """Plugin to automatically ban users for certain messages."""
     client: KantekClient = event.client
-    chat: Channel = await event.get_chat()
-    db: MySQLDB = client.db
-    chat_document = await db.groups.get_chat(event.chat_id)
-    db_named_tags: Dict = chat_document['named_tags']
+    context = EventContext.of(event)
+    uid = context.sender_id
+    if uid is not None:
+        # messages of users that are being banned are deleted once the ban is done
+        if client.bans.recently_banned(event.chat_id, uid):
+            return
+        if client.bans.defer_delete(event.chat_id, uid, event.message.id):
+            return
+    chat: Channel = await context.get_chat()
+    db_named_tags: Dict = (await context.get_tags()).named_tags
     bancmd = db_named_tags.get('gbancmd', 'manual')
     polizei_tag = db_named_tags.get('polizei')
     if polizei_tag == 'exclude':
         return
-    ban_type, ban_reason = await _check_message(event)
-    if ban_type and ban_reason:
-        uid = event.message.from_id
-        admins = [p.id for p in (await client.get_participants(event.chat_id, filter=ChannelParticipantsAdmins()))]
-        if uid not in admins:
-            await _banuser(event, chat, uid, bancmd, ban_type, ban_reason)
+    # other sessions in the same chat reuse the verdict instead of checking again
+    key = event_key(event)
+    ban_type, ban_reason = await client.coordinator.verdict(
+        key, functools.partial(_check_message, event))
+    if ban_type and ban_reason and not await context.is_admin():
+        await _claim_ban(client, key, chat, functools.partial(
+            _banuser, event, chat, uid, bancmd, ban_type, ban_reason))
 
 
 @events.register(events.chataction.ChatAction())
+@scheduled(Priority.JOIN)
 async def join_polizei(event: ChatAction.Event) -> None:
     """Plugin to ban users with blacklisted strings in their bio."""
     client: KantekClient = event.client
-    chat: Channel = await event.get_chat()
-    db: MySQLDB = client.db
-    chat_document = await db.groups.get_chat(event.chat_id)
-    db_named_tags: Dict = chat_document['named_tags']
+    if (client.bans.recently_banned(event.chat_id, event.user_id)
+            or client.bans.in_progress(event.chat_id, event.user_id)):
+        return
+    context = EventContext.of(event)
+    chat: Channel = await context.get_chat()
+    db_named_tags: Dict = (await context.get_tags()).named_tags
     bancmd = db_named_tags.get('gbancmd')
     polizei_tag = db_named_tags.get('polizei')
     if polizei_tag == 'exclude':
         return
+    key = event_key(event)
+    ban_type, ban_reason = await client.coordinator.verdict(
+        key, functools.partial(_check_join, event))
+
+    if ban_type and ban_reason:
+        await _claim_ban(client, key, chat, functools.partial(
+            _banuser, event, chat, event.user_id, bancmd, ban_type, ban_reason))
+
+
+async def _claim_ban(client: KantekClient, key: Optional[EventKey], chat: Channel,
+                     ban: Callable[[], Awaitable[None]]) -> None:
+    if key is None or _can_ban(chat):
+        if client.coordinator.claim('polizei', key):
+            await ban()
+    else:
+        # give a session that can ban in the chat the chance to claim it first,
+        # without holding up a scheduler worker while waiting
+        client.coordinator.claim_later('polizei', key, ban)
+
+
+async def _check_join(event: ChatAction.Event):
+    client: KantekClient = event.client
+    db: MySQLDB = client.db
     ban_type, ban_reason = False, False
-    bio_blacklist = await db.ab_bio_blacklist.get_all()
-    mhash_blacklist = await db.ab_mhash_blacklist.get_all()
+    bio_blacklist = db.ab_bio_blacklist.snapshot
+    mhash_blacklist = db.ab_mhash_blacklist.snapshot
 
     try:
         user: UserFull = await client(GetFullUserRequest(await event.get_input_user()))
     except TypeError as e:
         logger.error(e)
-        return
+        return False, False
 
-    for string in bio_blacklist:
-        if user.about and string in user.about:
-            ban_type, ban_reason = db.ab_bio_blacklist.hex_type, bio_blacklist[string]
+    if user.about:
+        # the last matching string wins, same as looping over the whole blacklist
+        match = bio_blacklist.index(AhoCorasick).last(user.about)
+        if match:
+            ban_type, ban_reason = db.ab_bio_blacklist.hex_type, match[1]
 
     if user.profile_photo:
-        dl_photo = await client.download_file(user.profile_photo)
-        photo_hash = await hash_photo(dl_photo)
+        photo_hash = await client.get_photo_hash(user.profile_photo)
 
-        for mhash in mhash_blacklist:
-            if hashes_are_similar(mhash, photo_hash, tolerance=2):
-                ban_type, ban_reason = db.ab_mhash_blacklist.hex_type, mhash_blacklist[mhash]
+        match = mhash_blacklist.index(BKTree).last(photo_hash, constants.MHASH_TOLERANCE)
+        if match:
+            ban_type, ban_reason = db.ab_mhash_blacklist.hex_type, match[1]
+    return ban_type, ban_reason
 
-    if ban_type and ban_reason:
-        await _banuser(event, chat, event.user_id, bancmd, ban_type, ban_reason)
+
+def _can_ban(chat: Channel) -> bool:
+    if getattr(chat, 'creator', False):
+        return True
+    admin_rights = getattr(chat, 'admin_rights', None)
+    return bool(admin_rights and admin_rights.ban_users)
 
 
 async def _banuser(event, chat, userid, bancmd, ban_type, ban_reason):
+    client: KantekClient = event.client
+    # only the first of several events for the same user bans, the others were deferred
+    if not client.bans.begin(event.chat_id, userid):
+        if not (isinstance(event, NewMessage.Event)
+                and client.bans.defer_delete(event.chat_id, userid, event.message.id)):
+            _delete_event(client, chat, event)
+        return
+    banned = False
+    try:
+        await _ban(event, chat, userid, bancmd, ban_type, ban_reason)
+        banned = True
+    finally:
+        deferred = client.bans.finish(event.chat_id, userid, banned)
+        if deferred and banned:
+            client.deletions.delete(chat, deferred)
+        elif deferred:
+            # the deferred messages weren't checked themselves, so they are kept
+            logger.warning('Banning %s in %s failed, keeping %s messages sent meanwhile',
+                           userid, event.chat_id, len(deferred))
+
+
+def _delete_event(client: KantekClient, chat: Channel,
+                  event: Union[ChatAction.Event, NewMessage.Event]) -> None:
+    message = event.action_message if isinstance(event, ChatAction.Event) else event.message
+    if message is not None:
+        client.deletions.delete(chat, [message.id])
+
+
+async def _ban(event, chat, userid, bancmd, ban_type, ban_reason):
     formatted_reason = f'Spambot[kv2 {ban_type} 0x{str(ban_reason).rjust(4, "0")}]'
     client: KantekClient = event.client
     db: MySQLDB = client.db
-    chat: Channel = await event.get_chat()
-    await event.delete()
+    _delete_event(client, chat, event)
 
-    sql = 'select count(*) as count from `banlist` where `id` = %s and `ban_reason` = %s'
-    res = await db.execute(sql, userid, formatted_reason, fetch='one')
-    if res['count'] > 0:
+    banned_user = await db.banlist.get_user(userid)
+    if banned_user and banned_user['ban_reason'] == formatted_reason:
         logger.info(f'User ID `{userid}` already banned for the same reason.')
         return
 
@@ -118,7 +200,6 @@ async def _banuser(event, chat, userid, bancmd, ban_type, ban_reason):
 
 
 async def _check_message(event):
-    client: KantekClient = event.client
     msg: Message = event.message
     user_id = msg.from_id
     if user_id is None:
@@ -128,12 +209,9 @@ async def _check_message(event):
         return False, False
 
     # no need to ban bots as they can only be added by users anyway
-    try:
-        user = await client.get_cached_entity(user_id)
-        if user.bot:
-            return False, False
-    except ValueError:
-        pass
+    user = await EventContext.of(event).get_sender()
+    if getattr(user, 'bot', False):
+        return False, False
 
     # commands used in bots to blacklist items, these will be used by admins
     # so they shouldnt be banned for it
@@ -144,154 +222,197 @@ async def _check_message(event):
         if msg.text and msg.text.startswith(cmd):
             return False, False
 
-    db: MySQLDB = client.db
-    string_blacklist = await db.ab_string_blacklist.get_all()
-    channel_blacklist = await db.ab_channel_blacklist.get_all()
-    domain_blacklist = await db.ab_domain_blacklist.get_all()
-    file_blacklist = await db.ab_file_blacklist.get_all()
-    mhash_blacklist = await db.ab_mhash_blacklist.get_all()
-    # tld_blacklist = await db.ab_tld_blacklist.get_all()
-    linkpreview_blacklist = await db.ab_linkpreview_blacklist.get_all()
-
-    inline_bot = msg.via_bot_id
+    verdict = await checks.run(event)
+    if verdict:
+        return verdict
+    return False, False
+
+
+checks: Pipeline[Tuple[str, int]] = Pipeline('polizei', polizei_check_budget)
+
+
+@checks.stage(Cost.MEMORY)
+async def _check_inline_bot(event: NewMessage.Event) -> Optional[Tuple[str, int]]:
+    db: MySQLDB = event.client.db
+    channel_blacklist = db.ab_channel_blacklist.snapshot
+    inline_bot = event.message.via_bot_id
     if inline_bot is not None and inline_bot in channel_blacklist:
         return db.ab_channel_blacklist.hex_type, channel_blacklist[inline_bot]
+    return None
 
-    if msg.web_preview:
-        domain = await helpers.netloc(msg.web_preview.url)
-        title = (msg.web_preview.title or '').lower()
-        description = (msg.web_preview.description or '').lower()
-
-        for item in linkpreview_blacklist:
-            _item = json.loads(item)
-            if (_item['domains'] is None or domain in _item['domains']) and\
-               (_item['string'] in title or _item['string'] in description):
-                return db.ab_linkpreview_blacklist.hex_type, linkpreview_blacklist[item]
 
+@checks.stage(Cost.MEMORY)
+async def _check_link_preview(event: NewMessage.Event) -> Optional[Tuple[str, int]]:
+    db: MySQLDB = event.client.db
+    msg: Message = event.message
+    if not msg.web_preview:
+        return None
+    linkpreview_blacklist = db.ab_linkpreview_blacklist.snapshot
+    domain = await helpers.netloc(msg.web_preview.url)
+    title = (msg.web_preview.title or '').lower()
+    description = (msg.web_preview.description or '').lower()
+
+    linkpreview_id = linkpreview_blacklist.index(LinkPreviewIndex).match(domain, title,
+                                                                         description)
+    if linkpreview_id is not None:
+        return db.ab_linkpreview_blacklist.hex_type, linkpreview_id
+    return None
+
+
+@checks.stage(Cost.MEMORY)
+async def _check_string(event: NewMessage.Event) -> Optional[Tuple[str, int]]:
+    db: MySQLDB = event.client.db
+    string_blacklist = db.ab_string_blacklist.snapshot
+    match = string_blacklist.index(AhoCorasick).first(event.message.raw_text)
+    if match:
+        return db.ab_string_blacklist.hex_type, match[1]
+    return None
+
+
+@checks.stage(Cost.NETWORK)
+async def _check_links(event: NewMessage.Event) -> Optional[Tuple[str, int]]:
+    client: KantekClient = event.client
+    msg: Message = event.message
+    # resolving urls and entities is slow so all of them are checked concurrently
+    link_checks = []
     if msg.buttons:
         _buttons = await msg.get_buttons()
         button: MessageButton
         for button in itertools.chain.from_iterable(_buttons):
             if button.url:
-                _, chat_id, _ = await helpers.resolve_invite_link(button.url)
-                if chat_id in channel_blacklist:
-                    return db.ab_channel_blacklist.hex_type, channel_blacklist[chat_id]
-
-                domain = await client.resolve_url(button.url)
-
-                if domain in domain_blacklist:
-                    return db.ab_domain_blacklist.hex_type, domain_blacklist[domain]
-
-                # tld_index = await _check_tld(domain, tld_blacklist)
-                # if tld_index:
-                #     return db.ab_tld_blacklist.hex_type, tld_index
-
-                face_domain = await helpers.netloc(button.url)
-                if face_domain in domain_blacklist:
-                    return db.ab_domain_blacklist.hex_type, domain_blacklist[face_domain]
-
-                elif domain in constants.TELEGRAM_DOMAINS:
-                    _entity = await client.get_cached_entity(domain)
-                    if _entity and _entity in channel_blacklist:
-                        return db.ab_channel_blacklist.hex_type, channel_blacklist[_entity]
-
-    entities = [e for e in msg.get_entities_text()]
-    for entity, text in entities:
-        link_creator, chat_id, random_part = await helpers.resolve_invite_link(text)
-        if chat_id in channel_blacklist.keys():
-            return db.ab_channel_blacklist.hex_type, channel_blacklist[chat_id]
-
-        domain = ''
-        face_domain = ''
-        channel = ''
-        _entity = None
-        if isinstance(entity, MessageEntityUrl):
-            domain = await client.resolve_url(text)
-            face_domain = await helpers.netloc(text)
-            if domain in constants.TELEGRAM_DOMAINS:
-                # remove any query parameters like ?start=
-                # replace @ since some spammers started using it, only Telegram X supports it
-                url = await client.resolve_url(text, base_domain=False)
-                username = url.split('?')[0].replace('@', '')
-                _entity = username
-
-        elif isinstance(entity, MessageEntityTextUrl):
-            domain = await client.resolve_url(entity.url)
-            face_domain = await helpers.netloc(entity.url)
-            if domain in constants.TELEGRAM_DOMAINS:
-                url = await client.resolve_url(entity.url, base_domain=False)
-                username = url.split('?')[0].replace('@', '')
-                _entity = username
-
-        elif isinstance(entity, MessageEntityMention):
-            _entity = text
-
-        if _entity:
-            try:
-                full_entity = await client.get_cached_entity(_entity)
-                channel = full_entity.id
-                profile_photo = await client.download_profile_photo(full_entity, bytes)
-                photo_hash = await hash_photo(profile_photo)
-
-                for mhash in mhash_blacklist:
-                    if hashes_are_similar(mhash, photo_hash, tolerance=2):
-                        return db.ab_mhash_blacklist.hex_type, mhash_blacklist[mhash]
-            except constants.GET_ENTITY_ERRORS as err:
-                logger.error(err)
-
-        # urllib doesnt like urls without a protocol
-        if not face_domain:
-            face_domain = await helpers.netloc(f'http://{domain}')
-
-        if domain:
-            if domain in domain_blacklist:
-                return db.ab_domain_blacklist.hex_type, domain_blacklist[domain]
-            # else:
-                # tld_index = await _check_tld(domain, tld_blacklist)
-                # if tld_index:
-                #     return db.ab_tld_blacklist.hex_type, tld_index
-
-        if face_domain:
-            if face_domain in domain_blacklist:
-                return db.ab_domain_blacklist.hex_type, domain_blacklist[face_domain]
-            # else:
-                # tld_index = await _check_tld(face_domain, tld_blacklist)
-                # if tld_index:
-                #     return db.ab_tld_blacklist.hex_type, tld_index
-
-        if channel and channel in channel_blacklist:
-            return db.ab_channel_blacklist.hex_type, channel_blacklist[channel]
-
-    for string in string_blacklist:
-        if string in msg.raw_text:
-            return db.ab_string_blacklist.hex_type, string_blacklist[string]
-
-    if msg.file:
-        # avoid a DoS when getting large files
-        ten_mib = (1024 ** 2) * 10
-        # Only download files to avoid downloading photos
-        if msg.document and msg.file.size < ten_mib:
-            dl_file = await msg.download_media(bytes)
-            filehash = helpers.hash_file(dl_file)
-            if filehash in file_blacklist:
-                return db.ab_file_blacklist.hex_type, file_blacklist[filehash]
-        else:
-            logger.warning('Skipped file because it was too large or not a document')
-
-    if msg.photo:
-        dl_photo = await msg.download_media(bytes)
-        photo_hash = await hash_photo(dl_photo)
-
-        for mhash in mhash_blacklist:
-            if hashes_are_similar(mhash, photo_hash, tolerance=2):
-                return db.ab_mhash_blacklist.hex_type, mhash_blacklist[mhash]
+                link_checks.append(functools.partial(_check_button, client, button.url))
+    for entity, text in msg.get_entities_text():
+        link_checks.append(functools.partial(_check_entity, client, entity, text))
+    return await helpers.first_result(link_checks, RESOLVE_CONCURRENCY)
 
-    return False, False
 
+@checks.stage(Cost.DOWNLOAD)
+async def _check_file(event: NewMessage.Event) -> Optional[Tuple[str, int]]:
+    client: KantekClient = event.client
+    db: MySQLDB = client.db
+    msg: Message = event.message
+    if not msg.file:
+        return None
+    # avoid a DoS when getting large files
+    # Only download files to avoid downloading photos
+    if msg.document and (max_file_check_size is None or msg.file.size < max_file_check_size):
+        file_blacklist = db.ab_file_blacklist.snapshot
+        filehash = await client.get_file_hash(msg.document)
+        if filehash in file_blacklist:
+            return db.ab_file_blacklist.hex_type, file_blacklist[filehash]
+    else:
+        logger.warning('Skipped file because it was too large or not a document')
+    return None
+
+
+@checks.stage(Cost.DOWNLOAD)
+async def _check_photo(event: NewMessage.Event) -> Optional[Tuple[str, int]]:
+    client: KantekClient = event.client
+    db: MySQLDB = client.db
+    msg: Message = event.message
+    if not msg.photo:
+        return None
+    mhash_blacklist = db.ab_mhash_blacklist.snapshot
+    photo_hash = await client.get_photo_hash(msg.photo)
+
+    match = mhash_blacklist.index(BKTree).first(photo_hash, constants.MHASH_TOLERANCE)
+    if match:
+        return db.ab_mhash_blacklist.hex_type, match[1]
+    return None
+
+
+async def _check_button(client: KantekClient, url: str) -> Optional[Tuple[str, int]]:
+    db: MySQLDB = client.db
+    channel_blacklist = db.ab_channel_blacklist.snapshot
+    domain_matcher = db.blacklists.index(DomainTrie, db.ab_domain_blacklist.hex_type,
+                                         db.ab_tld_blacklist.hex_type)
+
+    _, chat_id, _ = await helpers.resolve_invite_link(url)
+    if chat_id in channel_blacklist:
+        return db.ab_channel_blacklist.hex_type, channel_blacklist[chat_id]
 
-# async def _check_tld(domain, tld_blacklist):
-#     domain, tld = domain.split('.')
-#     if tld in tld_blacklist and domain != 'nic':
-#         return tld_blacklist[tld]
-#     else:
-#         return False
+    domain = await client.resolve_url(url)
+
+    match = domain_matcher.match(domain)
+    if match:
+        return match
+
+    face_domain = await helpers.netloc(url)
+    match = domain_matcher.match(face_domain)
+    if match:
+        return match
+
+    if domain in constants.TELEGRAM_DOMAINS:
+        _entity = await client.get_cached_entity(domain)
+        if _entity and _entity in channel_blacklist:
+            return db.ab_channel_blacklist.hex_type, channel_blacklist[_entity]
+    return None
+
+
+async def _check_entity(client: KantekClient, entity: TypeMessageEntity,
+                        text: str) -> Optional[Tuple[str, int]]:
+    db: MySQLDB = client.db
+    channel_blacklist = db.ab_channel_blacklist.snapshot
+    mhash_blacklist = db.ab_mhash_blacklist.snapshot
+    domain_matcher = db.blacklists.index(DomainTrie, db.ab_domain_blacklist.hex_type,
+                                         db.ab_tld_blacklist.hex_type)
+
+    link_creator, chat_id, random_part = await helpers.resolve_invite_link(text)
+    if chat_id in channel_blacklist.keys():
+        return db.ab_channel_blacklist.hex_type, channel_blacklist[chat_id]
+
+    domain = ''
+    face_domain = ''
+    channel = ''
+    _entity = None
+    if isinstance(entity, MessageEntityUrl):
+        domain = await client.resolve_url(text)
+        face_domain = await helpers.netloc(text)
+        if domain in constants.TELEGRAM_DOMAINS:
+            # remove any query parameters like ?start=
+            # replace @ since some spammers started using it, only Telegram X supports it
+            url = await client.resolve_url(text, base_domain=False)
+            username = url.split('?')[0].replace('@', '')
+            _entity = username
+
+    elif isinstance(entity, MessageEntityTextUrl):
+        domain = await client.resolve_url(entity.url)
+        face_domain = await helpers.netloc(entity.url)
+        if domain in constants.TELEGRAM_DOMAINS:
+            url = await client.resolve_url(entity.url, base_domain=False)
+            username = url.split('?')[0].replace('@', '')
+            _entity = username
+
+    elif isinstance(entity, MessageEntityMention):
+        _entity = text
+
+    if _entity:
+        try:
+            full_entity = await client.get_cached_entity(_entity)
+            channel = full_entity.id
+            photo_hash = await client.get_profile_photo_hash(full_entity)
+
+            if photo_hash is not None:
+                match = mhash_blacklist.index(BKTree).first(photo_hash, constants.MHASH_TOLERANCE)
+                if match:
+                    return db.ab_mhash_blacklist.hex_type, match[1]
+        except constants.GET_ENTITY_ERRORS as err:
+            logger.error(err)
+
+    # urllib doesnt like urls without a protocol
+    if not face_domain:
+        face_domain = await helpers.netloc(f'http://{domain}')
+
+    if domain:
+        match = domain_matcher.match(domain)
+        if match:
+            return match
+
+    if face_domain:
+        match = domain_matcher.match(face_domain)
+        if match:
+            return match
+
+    if channel and channel in channel_blacklist:
+        return db.ab_channel_blacklist.hex_type, channel_blacklist[channel]
+    return None
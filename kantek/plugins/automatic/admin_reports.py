@@ -10,8 +10,8 @@ from telethon.tl.types import Channel, User
 from telethon.utils import get_display_name
 
 import config
-from database.mysql import MySQLDB
 from utils.client import KantekClient
+from utils.context import EventContext
 
 __version__ = '0.1.0'
 
@@ -35,15 +35,14 @@ async def admin_reports(event: NewMessage.Event) -> None:
         return
 
     client: KantekClient = event.client
-    chat: Channel = await event.get_chat()
-    user: User = await event.get_sender()
-    reply: Message = await event.get_reply_message()
-    db: MySQLDB = client.db
-    chat_document = await db.groups.get_chat(event.chat_id)
-    db_named_tags: Dict = chat_document['named_tags']
+    context = EventContext.of(event)
+    db_named_tags: Dict = (await context.get_tags()).named_tags
     reports_tag = db_named_tags.get('reports')
     if reports_tag == 'exclude':
         return
+    chat: Channel = await context.get_chat()
+    user: User = await context.get_sender()
+    reply: Message = await event.get_reply_message()
     logged_reply = None
     if reply:
         try:
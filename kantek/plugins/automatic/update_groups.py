@@ -4,7 +4,7 @@ import logging
 from telethon import events
 from telethon.events import NewMessage
 
-from utils.client import KantekClient
+from utils.context import EventContext
 
 __version__ = '0.1.0'
 
@@ -23,5 +23,5 @@ async def add_groups(event: NewMessage.Event) -> None:
     """
     if event.is_private:
         return
-    client: KantekClient = event.client
-    await client.db.groups.get_chat(event.chat_id)
+    # loading the tags adds the chat to the db if it's missing
+    await EventContext.of(event).get_tags()
@@ -2,20 +2,19 @@
 import logging
 from pprint import pformat
 
-from telethon import events
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
 
-from config import cmd_prefix
-from utils import parsers
+from utils import helpers
 from utils.mdtex import Bold, Code, KeyValueItem, MDTeXDocument, Section, SubSection, Pre
+from utils.router import command
 
 __version__ = '0.1.0'
 
 tlog = logging.getLogger('kantek-channel-log')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}arg'))
+@command('arg')
 async def show_args(event: NewMessage.Event) -> None:
     """Show the raw output of the argument parser
 
@@ -26,8 +25,7 @@ async def show_args(event: NewMessage.Event) -> None:
 
     """
     msg: Message = event.message
-    _args = msg.raw_text.split()[1:]
-    keyword_args, args = parsers.parse_arguments(' '.join(_args))
+    keyword_args, args = await helpers.get_args(event)
     _args = []
     for arg in args:
         _args.append(SubSection(Code(arg),
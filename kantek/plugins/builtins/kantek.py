@@ -3,19 +3,21 @@ import logging
 import platform
 
 import telethon
-from telethon import events
 from telethon.events import NewMessage
 
-from config import cmd_prefix
+from utils.caching import LRUCache
 from utils.client import KantekClient
-from utils.mdtex import MDTeXDocument, Section, Bold, KeyValueItem
+from utils.mdtex import MDTeXDocument, Section, Bold, KeyValueItem, SubSection
+from utils.pipeline import Pipeline, pipelines
+from utils.router import command
+from utils.scheduler import scheduler
 
 __version__ = '0.3.0'
 
 tlog = logging.getLogger('kantek-channel-log')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}kantek'))
+@command('kantek')
 async def kantek(event: NewMessage.Event) -> None:
     """Show information about kantek.
 
@@ -32,6 +34,41 @@ async def kantek(event: NewMessage.Event) -> None:
                 KeyValueItem(Bold('version'), client.kantek_version),
                 KeyValueItem(Bold('telethon version'), telethon.__version__),
                 KeyValueItem(Bold('python version'), platform.python_version()),
-                KeyValueItem(Bold('plugins loaded'), len(client.plugin_mgr.active_plugins))))
+                KeyValueItem(Bold('plugins loaded'), len(client.plugin_mgr.active_plugins))),
+        Section(Bold('caches'),
+                _cache_stats('chats', client.db.groups.cache),
+                _cache_stats('urls', client.url_cache),
+                _cache_stats('file hashes', client.file_hash_cache),
+                _cache_stats('photo hashes', client.photo_hash_cache),
+                KeyValueItem(Bold('shared verdicts'), client.coordinator.shared)),
+        Section(Bold('scheduler'),
+                KeyValueItem(Bold('queued'), ', '.join(
+                    f'{priority.name.lower()} {depth}'
+                    for priority, depth in scheduler.depths().items())),
+                KeyValueItem(Bold('peak queued'), scheduler.peak_depth),
+                KeyValueItem(Bold('processed'), scheduler.processed),
+                KeyValueItem(Bold('dropped'), ', '.join(
+                    f'{priority.name.lower()} {dropped}'
+                    for priority, dropped in scheduler.dropped.items())),
+                KeyValueItem(Bold('deleted messages'),
+                             f'{client.deletions.deleted} deleted, '
+                             f'{client.deletions.failed} failed')),
+        Section(Bold('checks'),
+                *[_pipeline_stats(pipeline) for pipeline in pipelines.values()]))
 
     await client.respond(event, message, link_preview=False)
+
+
+def _cache_stats(name: str, cache: LRUCache) -> KeyValueItem:
+    return KeyValueItem(Bold(name),
+                        f'{len(cache)} entries, {cache.hits} hits, {cache.misses} misses '
+                        f'({cache.hit_rate:.0%})')
+
+
+def _pipeline_stats(pipeline: Pipeline) -> SubSection:
+    return SubSection(Bold(pipeline.name),
+                      KeyValueItem('timeouts', pipeline.timeouts),
+                      *[KeyValueItem(name, f'{timing.runs} runs, {timing.hits} hits, '
+                                           f'{timing.mean * 1000:.1f}ms avg, '
+                                           f'{timing.max * 1000:.0f}ms max')
+                        for name, timing in pipeline.timings.items()])
@@ -2,20 +2,19 @@
 from logging import Logger
 
 import logzero
-from telethon import events
 from telethon.events import NewMessage
-from telethon.tl.custom import Message
 
-from config import cmd_prefix
+from utils import helpers
 from utils.client import KantekClient
 from utils.pluginmgr import PluginManager
+from utils.router import command
 
 __version__ = '0.1.0'
 
 logger: Logger = logzero.logger
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}plugins'))
+@command('plugins')
 async def plugins(event: NewMessage.Event) -> None:
     """Command to show, register and unregister plugins.
 
@@ -27,8 +26,7 @@ async def plugins(event: NewMessage.Event) -> None:
     """
     client: KantekClient = event.client
     pluginmgr: PluginManager = client.plugin_mgr
-    msg: Message = event.message
-    args = msg.raw_text.split()[1:]
+    _, args = await helpers.get_args(event)
     response = False
     if not args:
         response = await _plugins_list(pluginmgr)
@@ -73,7 +71,7 @@ async def _plugins_unregister(event: NewMessage.Event,
     Returns:
 
     """
-    args = event.message.raw_text.split()[2:]
+    _, args = await helpers.get_subcommand_args(event)
     if not args:
         return 'No arguments specified.'
     if args[0] == 'all':
@@ -2,16 +2,15 @@
 import logging
 from typing import Dict, List
 
-from telethon import events
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
 from telethon.tl.types import Chat, Message
 
-from config import cmd_prefix
 from database.mysql import MySQLDB
-from utils import parsers
+from utils import helpers
 from utils.client import KantekClient
 from utils.mdtex import Bold, Code, Item, KeyValueItem, Section
+from utils.router import command
 from utils.tagmgr import TagManager
 
 __version__ = '0.1.0'
@@ -19,7 +18,7 @@ __version__ = '0.1.0'
 tlog = logging.getLogger('kantek-channel-log')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}tag'))
+@command('tag')
 async def tag(event: NewMessage.Event) -> None:
     """Add or remove tags from groups and channels.
 
@@ -34,7 +33,7 @@ async def tag(event: NewMessage.Event) -> None:
     db: MySQLDB = client.db
     msg: Message = event.message
     tag_mgr = await TagManager.load(event)
-    args = msg.raw_text.split()[1:]
+    keyword_args, args = await helpers.get_args(event)
     response = ''
     if not args:
         named_tags: Dict = tag_mgr.named_tags
@@ -46,7 +45,7 @@ async def tag(event: NewMessage.Event) -> None:
             data.append(Code('None'))
         response = Section(Item(f'Tags for {Bold(chat.title)}[{Code(event.chat_id)}]:'),
                            *data)
-    elif args[0] == 'add' and len(args) > 1:
+    elif args[0] == 'add' and (len(args) > 1 or keyword_args):
         await _add_tags(event)
     elif args[0] == 'clear':
         await tag_mgr.clear()
@@ -66,10 +65,8 @@ async def _add_tags(event: NewMessage.Event):
 
     Returns: A string with the action taken.
     """
-    msg: Message = event.message
-    args = msg.raw_text.split()[2:]
     tag_mgr = await TagManager.load(event)
-    named_tags, tags = parsers.parse_arguments(' '.join(args))
+    named_tags, tags = await helpers.get_subcommand_args(event)
     for name, value in named_tags.items():
         await tag_mgr.set_tag(name, value)
     for _tag in tags:
@@ -84,9 +81,7 @@ async def _delete_tags(event: NewMessage.Event):
 
     Returns: A string with the action taken.
     """
-    msg: Message = event.message
     tag_mgr = await TagManager.load(event)
-    args = msg.raw_text.split()[2:]
-    _, args = parsers.parse_arguments(' '.join(args))
+    _, args = await helpers.get_subcommand_args(event)
     for arg in args:
         await tag_mgr.del_tag(arg)
@@ -0,0 +1,91 @@
+"""Plugin to compare media hashes of photo thumbnails with the full photo."""
+import logging
+from typing import Dict, List
+
+from photohash import hash_distance
+from telethon.events import NewMessage
+from telethon.tl.custom import Message
+from telethon.tl.types import InputMessagesFilterPhotos, PhotoStrippedSize
+
+from utils import constants, helpers
+from utils.client import KantekClient
+from utils.mdtex import Bold, Italic, KeyValueItem, MDTeXDocument, Section, SubSection
+from utils.router import command
+
+__version__ = '0.1.0'
+
+tlog = logging.getLogger('kantek-channel-log')
+
+THUMBNAIL_SIZES = ['small', 'stripped']
+
+
+@command('calibrate')
+async def calibrate(event: NewMessage.Event) -> None:
+    """Hash the last photos of a chat with every photo size and compare them to the full size.
+
+    Args:
+        event: The event of the command
+
+    Returns: None
+
+    """
+    client: KantekClient = event.client
+    keyword_args, _ = await helpers.get_args(event)
+    limit = keyword_args.get('limit', 50)
+    waiting_message = await client.respond(event, f'Hashing up to {limit} photos.')
+
+    sizes = THUMBNAIL_SIZES + (['draft'] if helpers.photo_hash_draft_size else [])
+    distances: Dict[str, List[int]] = {size: [] for size in sizes}
+    downloaded: Dict[str, int] = {size: 0 for size in ['full'] + sizes}
+    samples = 0
+    msg: Message
+    async for msg in client.iter_messages(event.chat_id, limit=limit,
+                                          filter=InputMessagesFilterPhotos()):
+        if not msg.photo:
+            continue
+        samples += 1
+        full_photo = await client.download_media(msg.photo, bytes)
+        full_hash = await helpers.hash_photo(full_photo, draft_size=None)
+        downloaded['full'] += len(full_photo)
+        for size in THUMBNAIL_SIZES:
+            thumb = helpers.get_photo_thumb(msg.photo, size)
+            if size == 'stripped' and not isinstance(thumb, PhotoStrippedSize):
+                continue
+            thumb_photo = await client.download_media(msg.photo, bytes, thumb=thumb)
+            downloaded[size] += len(thumb_photo)
+            thumb_hash = await helpers.hash_photo(thumb_photo, draft_size=None)
+            distances[size].append(hash_distance(full_hash, thumb_hash))
+        if 'draft' in distances:
+            downloaded['draft'] += len(full_photo)
+            draft_hash = await helpers.hash_photo(full_photo)
+            distances['draft'].append(hash_distance(full_hash, draft_hash))
+
+    await waiting_message.delete()
+    if not samples:
+        await client.respond(event, MDTeXDocument(Section(Bold('Calibration'),
+                                                          Italic('No photos found'))))
+        return
+
+    sections = []
+    for size, size_distances in distances.items():
+        if not size_distances:
+            sections.append(SubSection(Bold(size), Italic('Not available')))
+            continue
+        within = sum(1 for d in size_distances if d <= constants.MHASH_TOLERANCE)
+        sections.append(SubSection(
+            Bold(size),
+            KeyValueItem('samples', len(size_distances)),
+            KeyValueItem('mean distance', f'{sum(size_distances) / len(size_distances):.2f}'),
+            KeyValueItem('max distance', max(size_distances)),
+            KeyValueItem('within tolerance', f'{within / len(size_distances):.0%}'),
+            KeyValueItem('avg size', f'{downloaded[size] / len(size_distances) / 1024:.1f}KiB')))
+    await client.respond(event, MDTeXDocument(
+        Section(Bold('Calibration'),
+                KeyValueItem('photos', samples),
+                KeyValueItem('full avg size', f'{downloaded["full"] / samples / 1024:.1f}KiB'),
+                *sections)))
+
+
+KantekClient.commands.update({
+    "calibrate": "Compares media hashes of photo thumbnails with the full photos in a chat \n Usage : calibrate [limit: <count>] \n Use it to decide on the photo_hash_size and photo_hash_draft_size config options"
+})
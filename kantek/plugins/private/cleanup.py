@@ -5,17 +5,16 @@ import logging
 from typing import Optional
 
 import logzero
-from telethon import events
 from telethon.errors import FloodWaitError, UserAdminInvalidError
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
 from telethon.tl.functions.channels import EditBannedRequest
 from telethon.tl.types import (Channel, ChannelParticipantsAdmins, ChatBannedRights, User)
 
-from config import cmd_prefix
 from utils import helpers
 from utils.client import KantekClient
 from utils.mdtex import Bold, KeyValueItem, MDTeXDocument, Section
+from utils.router import command
 
 __version__ = '0.3.0'
 
@@ -23,7 +22,7 @@ tlog = logging.getLogger('kantek-channel-log')
 logger: logging.Logger = logzero.logger
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}cleanup'))
+@command('cleanup')
 async def cleanup(event: NewMessage.Event) -> None:
     """Command to remove Deleted Accounts from a group or network."""
     chat: Channel = await event.get_chat()
@@ -6,10 +6,9 @@ from telethon.events import NewMessage
 from telethon.tl.patched import Message
 from telethon.tl.types import Channel
 
-from config import cmd_prefix
 from utils.client import KantekClient
 
-__version__ = '0.1.0'
+__version__ = '0.1.1'
 
 from utils.constants import SCHEDULE_DELETION_COMMAND
 
@@ -26,8 +25,9 @@ async def delete(event: NewMessage.Event) -> None:
     Returns: None
 
     """
+    client: KantekClient = event.client
     msg: Message = event.message
-    await msg.delete()
+    message_ids = [msg.id]
     if msg.is_reply:
-        reply_msg: Message = await msg.get_reply_message()
-        await reply_msg.delete()
+        message_ids.append(msg.reply_to_msg_id)
+    await client.deletions.delete(await event.get_input_chat(), message_ids)
@@ -1,19 +1,18 @@
 """Get information about commands."""
 import logging
 
-from telethon import events
 from telethon.events import NewMessage
 
-from config import cmd_prefix
 from utils.client import KantekClient
 from utils.helpers import get_args
+from utils.router import command
 
 __version__ = '0.0.1'
 
 tlog = logging.getLogger('kantek-channel-log')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}h(elp)?'))
+@command('help', 'h')
 async def help(event: NewMessage.Event) -> None:
     """Command to get a list of all the commands stored in the dict."""
     client: KantekClient = event.client
@@ -26,15 +25,15 @@ async def help(event: NewMessage.Event) -> None:
     unavailable = "\n\n**Commands not in Kantek or have help:**"
 
     if args:
-        for command in args:
-            info = commands.get(command, False)
+        for name in args:
+            info = commands.get(name, False)
             if info:
-                commands_list.append(f"\n  **{command}:** {info}")
+                commands_list.append(f"\n  **{name}:** {info}")
             else:
-                noncommands_list.append(f"\n  **{command}**")
+                noncommands_list.append(f"\n  **{name}**")
     else:
-        for command, info in commands.items():
-            commands_list.append(f"\n  **{command}**")
+        for name in commands:
+            commands_list.append(f"\n  **{name}**")
 
     if commands_list or noncommands_list:
         if commands_list and noncommands_list:
@@ -1,20 +1,19 @@
 """Get information on a invite link."""
 import logging
 
-from telethon import events
 from telethon.events import NewMessage
 
-from config import cmd_prefix
 from utils import helpers
 from utils.client import KantekClient
 from utils.mdtex import Bold, Code, KeyValueItem, MDTeXDocument, Section
+from utils.router import command
 
 __version__ = '0.1.0'
 
 tlog = logging.getLogger('kantek-channel-log')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}i(nvite)?l(ink)?'))
+@command('invitelink', 'il')
 async def invitelink(event: NewMessage.Event) -> None:
     """Command to get link creator, chatid and the random part of an invite link."""
     client: KantekClient = event.client
@@ -1,23 +1,22 @@
 """Plugin to manage the autobahn"""
 import logging
 
-from telethon import events
 from telethon.errors import ChatNotModifiedError
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
 from telethon.tl.functions.messages import EditChatDefaultBannedRightsRequest
 from telethon.tl.types import ChannelParticipantsAdmins, ChatBannedRights, InputPeerChannel
 
-from config import cmd_prefix
 from utils.client import KantekClient
 from utils.mdtex import MDTeXDocument
+from utils.router import command
 
 __version__ = '0.1.0'
 
 tlog = logging.getLogger('kantek-channel-log')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}lock'))
+@command('lock')
 async def lock(event: NewMessage.Event) -> None:
     """Command to quickly lock a chat to readonly for normal users."""
     client: KantekClient = event.client
@@ -2,13 +2,12 @@
 import logging
 
 from spamwatch.types import Permission
-from telethon import events
 from telethon.events import NewMessage
 
-from config import cmd_prefix
 from utils import helpers
 from utils.client import KantekClient
 from utils.mdtex import Bold, Code, KeyValueItem, MDTeXDocument, Section
+from utils.router import command
 
 __version__ = '0.1.0'
 
@@ -16,7 +15,7 @@ tlog = logging.getLogger('kantek-channel-log')
 
 # TODO: Make this nice, this is just a skeleton so I have an easy way of creating tokens,
 #  preferably clean this up at some point
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}s(pam)?w(atch)?'))
+@command('spamwatch', 'sw')
 async def sw(event: NewMessage.Event) -> None:
     """Command to create SpamWatch Tokens"""
     client: KantekClient = event.client
@@ -2,7 +2,6 @@
 import logging
 from typing import Union
 
-from telethon import events
 from telethon.events import NewMessage
 from telethon.tl.custom import Forward, Message
 from telethon.tl.functions.channels import GetParticipantRequest
@@ -10,19 +9,19 @@ from telethon.tl.types import (Channel, ChannelParticipantAdmin,
                                ChannelParticipantSelf, MessageEntityMention,
                                MessageEntityMentionName, User)
 
-from config import cmd_prefix
 from database.mysql import MySQLDB
-from utils import constants, helpers, parsers
+from utils import constants, helpers
 from utils.client import KantekClient
 from utils.mdtex import (Bold, Code, Italic, KeyValueItem, Link, MDTeXDocument,
                          Section, SubSection)
+from utils.router import command
 
-__version__ = '0.1.2'
+__version__ = '0.1.3'
 
 tlog = logging.getLogger('kantek-channel-log')
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}u(ser)?'))
+@command('user', 'u')
 async def user_info(event: NewMessage.Event) -> None:
     """Show information about a user.
 
@@ -35,12 +34,7 @@ async def user_info(event: NewMessage.Event) -> None:
     chat: Channel = await event.get_chat()
     client: KantekClient = event.client
     msg: Message = event.message
-    # crude hack until I have a proper way to have commands with short options
-    # without this ungban will always trigger user too
-    if 'ungban' in msg.text:
-        return
-    _args = msg.raw_text.split()[1:]
-    keyword_args, args = parsers.parse_arguments(' '.join(_args))
+    keyword_args, args = await helpers.get_args(event)
     response = ''
     if not args and msg.is_reply:
         response = await _info_from_reply(event, **keyword_args)
@@ -50,7 +44,7 @@ async def user_info(event: NewMessage.Event) -> None:
         await client.respond(event, response)
 
 
-@events.register(events.NewMessage(outgoing=True, pattern=f'{cmd_prefix}add(ed)?'))
+@command('added', 'add')
 async def added(event: NewMessage.Event) -> None:
     client: KantekClient = event.client
     chat: Channel = await event.get_input_chat()
@@ -0,0 +1,84 @@
+"""Keep track of bans that are in progress or just happened."""
+from typing import Dict, List, Tuple
+
+from utils.caching import LRUCache
+
+try:
+    from config import recent_ban_ttl
+except ImportError:
+    recent_ban_ttl = 5 * 60
+
+BanKey = Tuple[int, int]
+
+
+class BanRegistry:
+    """Make sure a user is only banned once per chat.
+
+    While a ban is in progress, messages the user sends are only collected
+    so they can be deleted together once the ban is done. After that the user
+    is remembered as recently banned for `ttl` seconds and further updates
+    can be dropped without checking them.
+
+    Args:
+        maxsize: Maximum number of remembered bans
+        ttl: Seconds a finished ban is remembered
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = recent_ban_ttl) -> None:
+        self._pending: Dict[BanKey, List[int]] = {}
+        self._recent = LRUCache(maxsize, ttl)
+
+    def begin(self, chat_id: int, user_id: int) -> bool:
+        """Start banning a user.
+
+        Args:
+            chat_id: The chat
+            user_id: The user
+
+        Returns: False if the user is already being banned or was banned recently
+        """
+        key = (chat_id, user_id)
+        if key in self._pending or key in self._recent:
+            return False
+        self._pending[key] = []
+        return True
+
+    def finish(self, chat_id: int, user_id: int, banned: bool = True) -> List[int]:
+        """Finish banning a user.
+
+        Args:
+            chat_id: The chat
+            user_id: The user
+            banned: False if the ban failed, the user isn't remembered then
+
+        Returns: Ids of the messages sent while the ban was in progress, they
+            weren't checked and should only be deleted if the ban succeeded
+        """
+        key = (chat_id, user_id)
+        if banned:
+            self._recent.set(key, True)
+        return self._pending.pop(key, [])
+
+    def defer_delete(self, chat_id: int, user_id: int, message_id: int) -> bool:
+        """Collect a message of a user that is being banned.
+
+        Args:
+            chat_id: The chat
+            user_id: The sender of the message
+            message_id: The message
+
+        Returns: False if no ban of the user is in progress
+        """
+        pending = self._pending.get((chat_id, user_id))
+        if pending is None:
+            return False
+        pending.append(message_id)
+        return True
+
+    def in_progress(self, chat_id: int, user_id: int) -> bool:
+        """If the user is being banned from the chat right now."""
+        return (chat_id, user_id) in self._pending
+
+    def recently_banned(self, chat_id: int, user_id: int) -> bool:
+        """If the user was banned from the chat within the last `ttl` seconds."""
+        return (chat_id, user_id) in self._recent
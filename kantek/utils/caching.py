@@ -0,0 +1,93 @@
+"""Small in-memory caches with hit/miss accounting."""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A least recently used cache with an optional time to live.
+
+    Attributes:
+        maxsize: Maximum number of entries, None for an unbounded cache
+        ttl: Seconds an entry stays valid, None to never expire
+        hits: Number of lookups that were answered from the cache
+        misses: Number of lookups that weren't
+    """
+
+    def __init__(self, maxsize: Optional[int] = 1024, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for a key and count the lookup.
+
+        Args:
+            key: The cache key
+            default: Returned if the key is missing or expired
+
+        Returns: The cached value or default
+        """
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            value, expires = entry
+            if expires is None or expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for a key without counting the lookup or refreshing it."""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value and evict the least recently used entry if the cache is full.
+
+        Args:
+            key: The cache key
+            value: The value to store
+            ttl: Overrides the caches default ttl for this entry
+
+        Returns: None
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove a key from the cache if it exists."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries, the counters are kept."""
+        self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were hits."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return False
+        expires = entry[1]
+        return expires is None or expires > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
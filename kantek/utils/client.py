@@ -2,38 +2,87 @@
 import ast
 import asyncio
 import datetime
+import functools
 import logging
 import re
 import socket
-from typing import Optional, Tuple, Union
+from typing import Callable, Dict, FrozenSet, Optional, Tuple, Union
 
 import logzero
 import spamwatch
 from aiohttp import ClientError, ClientSession, ClientTimeout
 from faker import Faker
 from spamwatch.types import Permission
-from telethon import TelegramClient, hints
+from telethon import TelegramClient, events, hints, utils
 from telethon.errors import UserAdminInvalidError
 from telethon.events import ChatAction, NewMessage
 from telethon.tl.custom import Message
 from telethon.tl.functions.channels import EditBannedRequest
 from telethon.tl.patched import Message
-from telethon.tl.types import ChatBannedRights
-from yarl import URL
+from telethon.tl.types import (Channel, ChannelParticipantsAdmins, Chat, ChatBannedRights, Document,
+                               PeerChannel, PeerChat, Photo, UpdateChannel,
+                               UpdateChatParticipantAdmin, User)
 
 import config
 from config import cmd_prefix
 from database.mysql import MySQLDB
+from utils.banregistry import BanRegistry
+from utils.caching import LRUCache
 from utils.constants import SCHEDULE_DELETION_COMMAND
+from utils.coordinator import EventCoordinator
+from utils.deletion import DeletionQueue
+from utils.helpers import get_photo_thumb, hash_file_chunks, hash_photo
 from utils.mdtex import FormattedBase, MDTeXDocument, Section
 from utils.pluginmgr import PluginManager
+from utils.resolver import RedirectResolver, ResolvedUrl, get_base_domain
+
+try:
+    from config import url_cache_negative_ttl, url_cache_persistent, url_cache_size, url_cache_ttl
+except ImportError:
+    url_cache_size = 10000
+    url_cache_ttl = 6 * 60 * 60
+    url_cache_negative_ttl = 5 * 60
+    url_cache_persistent = False
+
+try:
+    from config import url_resolver
+except ImportError:
+    url_resolver = 'head'
+
+try:
+    from config import file_hash_cache_persistent, file_hash_cache_size
+except ImportError:
+    file_hash_cache_size = 10000
+    file_hash_cache_persistent = False
+
+try:
+    from config import photo_hash_cache_size
+except ImportError:
+    photo_hash_cache_size = 10000
+
+try:
+    from config import photo_hash_size
+except ImportError:
+    photo_hash_size = 'full'
+
+try:
+    from config import admin_cache_size, admin_cache_ttl
+except ImportError:
+    admin_cache_size = 10000
+    admin_cache_ttl = 10 * 60
 
 logger: logging.Logger = logzero.logger
 
+_MISSING = object()
+
 AUTOMATED_BAN_REASONS = ['spambot', 'vollzugsanstalt', 'kriminalamt']
 SPAMADD_PATTERN = re.compile(r"(?i)spam adding (?P<count>\d+)\+ members")
 
 
+def _report_progress(callback: Callable[[int, int], None], total: int, received: int) -> None:
+    callback(received, total)
+
+
 class KantekClient(TelegramClient):  # pylint: disable = R0901, W0223
     """Custom telethon client that has the plugin manager as attribute."""
     commands: dict = {}
@@ -44,10 +93,26 @@ class KantekClient(TelegramClient):  # pylint: disable = R0901, W0223
     sw: spamwatch.Client = None
     sw_url: str = None
     aioclient: ClientSession = None
+    # shared by all sessions of this process
+    url_cache: LRUCache = LRUCache(maxsize=url_cache_size, ttl=url_cache_ttl)
+    url_resolver: RedirectResolver = RedirectResolver()
+    file_hash_cache: LRUCache = LRUCache(maxsize=file_hash_cache_size)
+    photo_hash_cache: LRUCache = LRUCache(maxsize=photo_hash_cache_size)
+    coordinator: EventCoordinator = EventCoordinator()
+    admin_cache: LRUCache = LRUCache(maxsize=admin_cache_size, ttl=admin_cache_ttl)
+    _admin_requests: Dict[int, asyncio.Future] = {}
+    _faker: Faker = Faker()
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.aioclient = ClientSession(timeout=ClientTimeout(total=2))
+        # message ids of basic groups differ between sessions so this isn't shared
+        self.bans = BanRegistry()
+        self.deletions = DeletionQueue(self)
+        self.add_event_handler(self._invalidate_admins, events.ChatAction(
+            func=lambda e: e.user_left or e.user_kicked))
+        self.add_event_handler(self._invalidate_admins, events.Raw(
+            [UpdateChannel, UpdateChatParticipantAdmin]))
 
     async def respond(self, event: NewMessage.Event,
                       msg: Union[str, FormattedBase, Section, MDTeXDocument],
@@ -95,8 +160,7 @@ class KantekClient(TelegramClient):  # pylint: disable = R0901, W0223
         if uid is None:
             return
 
-        sql = 'select * from `banlist` where `id` = %s limit 1'
-        user = await self.db.execute(sql, uid, fetch='one')
+        user = await self.db.banlist.get_user(uid)
 
         for ban_reason in AUTOMATED_BAN_REASONS:
             if user and (ban_reason in user['ban_reason'].lower()):
@@ -121,10 +185,7 @@ class KantekClient(TelegramClient):  # pylint: disable = R0901, W0223
                 message.format(uid=uid, reason=reason))
         await asyncio.sleep(0.5)
 
-        sql = 'insert into `banlist` (`id`, `ban_reason`) values (%s, %s)'\
-              'on duplicate key update `ban_reason` = %s'
-        await self.db.execute(sql, uid, reason, reason)
-        await self.db.save()
+        await self.db.banlist.add_user(uid, reason)
 
         if self.sw and self.sw.permission in [Permission.Admin,
                                               Permission.Root]:
@@ -154,9 +215,7 @@ class KantekClient(TelegramClient):  # pylint: disable = R0901, W0223
         await asyncio.sleep(10)
         await self.edit_folder(config.gban_group, folder=1)
 
-        sql = 'delete from `banlist` where `id` = %s'
-        await self.db.execute(sql, uid)
-        await self.db.save()
+        await self.db.banlist.delete_user(uid)
 
         if self.sw and self.sw.permission in [Permission.Admin,
                                               Permission.Root]:
@@ -174,10 +233,127 @@ class KantekClient(TelegramClient):  # pylint: disable = R0901, W0223
         except UserAdminInvalidError as err:
             logger.error(err)
 
+    async def get_admins(self, chat: hints.EntityLike) -> FrozenSet[int]:
+        """Return the ids of the admins of a chat.
+
+        The list is cached for `admin_cache_ttl` seconds and dropped early when
+        an admin of the chat changes or one of the cached admins leaves.
+        Concurrent callers share a single request.
+
+        Args:
+            chat: The chat or its id
+
+        Returns: The user ids of all admins
+        """
+        chat_id = chat if isinstance(chat, int) else utils.get_peer_id(chat)
+        admins = self.admin_cache.get(chat_id)
+        if admins is not None:
+            return admins
+        request = self._admin_requests.get(chat_id)
+        if request is None:
+            request = asyncio.ensure_future(self._fetch_admins(chat_id))
+            self._admin_requests[chat_id] = request
+            request.add_done_callback(lambda _: self._admin_requests.pop(chat_id, None))
+        return await asyncio.shield(request)
+
+    async def _fetch_admins(self, chat_id: int) -> FrozenSet[int]:
+        participants = await self.get_participants(chat_id, filter=ChannelParticipantsAdmins())
+        admins = frozenset(p.id for p in participants)
+        self.admin_cache.set(chat_id, admins)
+        return admins
+
+    async def _invalidate_admins(self, event: Union[ChatAction.Event, events.Raw]) -> None:
+        if isinstance(event, ChatAction.Event):
+            # joins and members leaving don't change the admins, only an admin leaving does
+            admins = self.admin_cache.peek(event.chat_id)
+            if admins is not None and admins.intersection(event.user_ids or []):
+                self.admin_cache.invalidate(event.chat_id)
+            return
+        if isinstance(event, UpdateChannel):
+            # also sent when the rights of this session change
+            chat_id = utils.get_peer_id(PeerChannel(event.channel_id))
+        else:
+            chat_id = utils.get_peer_id(PeerChat(event.chat_id))
+        self.admin_cache.invalidate(chat_id)
+
     async def get_cached_entity(self, entity: hints.EntitiesLike):
         input_entity = await self.get_input_entity(entity)
         return await self.get_entity(input_entity)
 
+    async def get_file_hash(self, document: Document,
+                            progress_callback: Optional[Callable[[int, int], None]] = None) -> str:
+        """Return the hash of a document, downloading it only if it wasn't hashed before.
+
+        The document is hashed chunk by chunk while it is downloaded, so memory
+        usage doesn't depend on the size of the file.
+
+        Args:
+            document: The document
+            progress_callback: Called with received and total bytes while downloading
+
+        Returns:
+            The hash as returned by helpers.hash_file
+        """
+        key = (document.id, document.size, document.dc_id)
+        file_hash = self.file_hash_cache.get(key)
+        if file_hash is not None:
+            return file_hash
+
+        if file_hash_cache_persistent:
+            file_hash = await self.db.file_hashes.get(*key)
+        if file_hash is None:
+            download_progress = None
+            if progress_callback is not None:
+                download_progress = functools.partial(_report_progress, progress_callback,
+                                                      document.size)
+            file_hash = await hash_file_chunks(self.iter_download(document), download_progress)
+            if file_hash_cache_persistent:
+                await self.db.file_hashes.set(*key, file_hash)
+        self.file_hash_cache.set(key, file_hash)
+        return file_hash
+
+    async def get_photo_hash(self, photo: Photo) -> str:
+        """Return the media hash of a photo, downloading it only if it wasn't hashed before.
+
+        Only the size selected by `photo_hash_size` is downloaded.
+
+        Args:
+            photo: The photo of a message or a full user
+
+        Returns:
+            The hash as returned by helpers.hash_photo
+        """
+        photo_hash = self.photo_hash_cache.get(photo.id)
+        if photo_hash is None:
+            thumb = get_photo_thumb(photo, photo_hash_size)
+            photo_hash = await hash_photo(await self.download_media(photo, bytes, thumb=thumb))
+            self.photo_hash_cache.set(photo.id, photo_hash)
+        return photo_hash
+
+    async def get_profile_photo_hash(self, entity: Union[User, Chat, Channel]) -> Optional[str]:
+        """Return the media hash of the current profile photo of a user or chat.
+
+        Args:
+            entity: The user or chat
+
+        Returns:
+            The hash as returned by helpers.hash_photo or None if there is no photo
+        """
+        # a new profile photo always has a new id so cached hashes never become stale
+        photo_id = getattr(entity.photo, 'photo_id', None)
+        if photo_id is not None:
+            photo_hash = self.photo_hash_cache.get(photo_id)
+            if photo_hash is not None:
+                return photo_hash
+        profile_photo = await self.download_profile_photo(entity, bytes,
+                                                          download_big=photo_hash_size == 'full')
+        if profile_photo is None:
+            return None
+        photo_hash = await hash_photo(profile_photo)
+        if photo_id is not None:
+            self.photo_hash_cache.set(photo_id, photo_hash)
+        return photo_hash
+
     async def resolve_url(self, url: str, base_domain: bool = True) -> str:
         """Follow all redirects and return the base domain
 
@@ -188,23 +364,51 @@ class KantekClient(TelegramClient):  # pylint: disable = R0901, W0223
         Returns:
             The base comain as given by urllib.parse
         """
-        faker = Faker()
-        headers = {'User-Agent': faker.user_agent()}
-        old_url = url
-        if not url.startswith('http'):
-            url = f'http://{url}'
+        resolved = await self.follow_url(url)
+        if resolved is None:
+            return url
+        return resolved.base_domain if base_domain else resolved.url
+
+    async def follow_url(self, url: str) -> Optional[ResolvedUrl]:
+        """Follow all redirects of a url and return the whole redirect chain.
+
+        Results are cached in memory and, if `url_cache_persistent` is set, in the DB.
+        Failed lookups are cached for a shorter time.
+
+        Args:
+            url: The url
+
+        Returns:
+            The resolved url or None if it couldn't be resolved
+        """
+        resolved = self.url_cache.get(url, _MISSING)
+        if resolved is not _MISSING:
+            return resolved
+
+        resolved = None
+        if url_cache_persistent:
+            resolved = await self.db.url_cache.get(url)
+        if resolved is None:
+            resolved = await self._follow_url(url)
+            if resolved is None:
+                self.url_cache.set(url, None, ttl=url_cache_negative_ttl)
+                return None
+            if url_cache_persistent:
+                await self.db.url_cache.set(url, resolved, ttl=url_cache_ttl)
+        self.url_cache.set(url, resolved)
+        return resolved
+
+    async def _follow_url(self, url: str) -> Optional[ResolvedUrl]:
+        headers = {'User-Agent': self._faker.user_agent()}
         try:
+            if url_resolver == 'head':
+                return await self.url_resolver.resolve(url, headers=headers)
+            if not url.startswith('http'):
+                url = f'http://{url}'
             async with self.aioclient.get(url, headers=headers) as response:
-                url: URL = response.url
-        except (ClientError, asyncio.TimeoutError, socket.gaierror) as err:
+                chain = [str(r.url) for r in response.history] + [str(response.url)]
+                return ResolvedUrl(str(response.url), chain,
+                                   get_base_domain(response.url.host or ''))
+        except (ClientError, asyncio.TimeoutError, socket.gaierror, ValueError) as err:
             logger.warning(err)
-            return old_url
-
-        if base_domain:
-            # split up the result to only get the base domain
-            # www.sitischu.com => sitischu.com
-            url = url.host
-            _base_domain = url.split('.', maxsplit=url.count('.') - 1)[-1]
-            if _base_domain:
-                url = _base_domain
-        return str(url)
+            return None
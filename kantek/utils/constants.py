@@ -10,6 +10,12 @@ TELEGRAM_DOMAINS = ['t.me',
                     'graph.org',
                     'contest.dev']
 
+# second level labels that are exempt from the tld blacklist, like nic.xyz
+TLD_BLACKLIST_EXCEPTIONS = ['nic']
+
 GET_ENTITY_ERRORS = (UsernameNotOccupiedError, UsernameInvalidError, ValueError, InviteHashInvalidError)
 
+# maximum distance at which a media hash counts as blacklisted
+MHASH_TOLERANCE = 2
+
 SCHEDULE_DELETION_COMMAND = "kantek_scheduled_delete"
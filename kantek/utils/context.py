@@ -0,0 +1,85 @@
+"""Data about an update that is shared by all plugins handling it."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from telethon.events import ChatAction, NewMessage
+from telethon.tl.types import Channel, Chat, User
+
+from utils.client import KantekClient
+from utils.tagmgr import TagManager
+
+Event = Union[ChatAction.Event, NewMessage.Event]
+
+
+class EventContext:
+    """Lazily fetched chat, sender, chat document and admin status of an update.
+
+    Telethon builds a separate event for every plugin that handles an update,
+    but all of them share the same `original_update`. The context is attached
+    to it so the first plugin that needs something fetches it and the others
+    reuse the result. Concurrent requests for the same value share one fetch.
+
+    Use `EventContext.of(event)` instead of creating it directly.
+    """
+
+    def __init__(self, event: Event) -> None:
+        self.client: KantekClient = event.client
+        self.chat_id: int = event.chat_id
+        self._event = event
+        self._values: Dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def of(cls, event: Event) -> 'EventContext':
+        """Return the context of the update an event was built from.
+
+        Args:
+            event: Any event of the update
+
+        Returns: The shared context
+        """
+        update = event.original_update
+        context: Optional[EventContext] = getattr(update, '_kantek_context', None)
+        if context is None or context.client is not event.client:
+            context = cls(event)
+            if update is not None:
+                update._kantek_context = context
+        return context
+
+    async def _get(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._values.get(name)
+        if future is None or _failed(future):
+            # a failed fetch is retried by the next caller
+            future = self._values[name] = asyncio.ensure_future(fetch())
+        return await asyncio.shield(future)
+
+    @property
+    def sender_id(self) -> Optional[int]:
+        """The id of the user that joined or sent the message."""
+        if isinstance(self._event, ChatAction.Event):
+            return self._event.user_id
+        return self._event.message.from_id
+
+    async def get_chat(self) -> Union[Channel, Chat, User]:
+        """The chat of the update."""
+        return await self._get('chat', self._event.get_chat)
+
+    async def get_sender(self) -> Optional[User]:
+        """The user that joined or sent the message."""
+        if isinstance(self._event, ChatAction.Event):
+            return await self._get('sender', self._event.get_user)
+        return await self._get('sender', self._event.get_sender)
+
+    async def get_tags(self) -> TagManager:
+        """The tags of the chat."""
+        return await self._get('tags', lambda: TagManager.load(self._event))
+
+    async def is_admin(self) -> bool:
+        """If the sender is an admin of the chat."""
+        return await self._get('admin', self._is_admin)
+
+    async def _is_admin(self) -> bool:
+        return self.sender_id in await self.client.get_admins(self.chat_id)
+
+
+def _failed(future: asyncio.Future) -> bool:
+    return future.done() and (future.cancelled() or future.exception() is not None)
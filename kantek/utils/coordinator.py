@@ -0,0 +1,122 @@
+"""Share the work on an update between all sessions of this process."""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Hashable, Optional, Tuple, TypeVar, Union
+
+import logzero
+from telethon.events import ChatAction, NewMessage
+
+from utils.caching import LRUCache
+
+logger: logging.Logger = logzero.logger
+
+T = TypeVar('T')
+EventKey = Tuple[Hashable, ...]
+
+
+def event_key(event: Union[ChatAction.Event, NewMessage.Event]) -> Optional[EventKey]:
+    """Return a key that is the same for an update no matter which session received it.
+
+    Only updates of channels and supergroups have a key, message ids of basic
+    groups are numbered per account so they can't be matched between sessions.
+    Edits get a different key than the original message so they are checked again.
+
+    Args:
+        event: A NewMessage, MessageEdited or ChatAction event
+
+    Returns: The key or None if the event can't be identified
+    """
+    if not event.is_channel:
+        return None
+    if isinstance(event, ChatAction.Event):
+        if (event.user_joined or event.user_added) and event.action_message is not None:
+            # every join has its own service message, so rejoining is checked again
+            return event.chat_id, 'join', event.user_id, event.action_message.id
+        return None
+    msg = event.message
+    return event.chat_id, msg.id, msg.edit_date
+
+
+class EventCoordinator:
+    """Make sure an update is only checked and acted upon once.
+
+    When several sessions are in the same chat all of them receive the same
+    updates. The first one to check an update runs the check, the others wait
+    for and reuse its verdict. Acting on a verdict is claimed separately so
+    a session with the rights to ban can be preferred.
+
+    Updates without a key are always checked and acted upon.
+
+    Args:
+        maxsize: Maximum number of remembered updates
+        ttl: Seconds an update is remembered
+        grace: Seconds a session without the preferred rights waits before claiming an action
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 5 * 60, grace: float = 1) -> None:
+        self.grace = grace
+        self._verdicts = LRUCache(maxsize, ttl)
+        self._claims = LRUCache(maxsize, ttl)
+
+    async def verdict(self, key: Optional[EventKey], check: Callable[[], Awaitable[T]]) -> T:
+        """Run a check once per key and share its result.
+
+        Args:
+            key: The key of the update
+            check: Coroutine function that checks the update
+
+        Returns: The result of the check
+        """
+        if key is None:
+            return await check()
+        future = self._verdicts.get(key)
+        if future is None:
+            future = asyncio.ensure_future(check())
+            self._verdicts.set(key, future)
+        # a cancelled waiter must not cancel the check for the other sessions
+        return await asyncio.shield(future)
+
+    def claim(self, action: str, key: Optional[EventKey]) -> bool:
+        """Claim an action for an update.
+
+        Args:
+            action: Name of the action, like the plugin taking it
+            key: The key of the update
+
+        Returns: True if the caller should act
+        """
+        if key is None:
+            return True
+        if (action, key) in self._claims:
+            return False
+        self._claims.set((action, key), True)
+        return True
+
+    def claim_later(self, action: str, key: Optional[EventKey],
+                    act: Callable[[], Awaitable[None]]) -> None:
+        """Claim an action after `grace` seconds and run it if the claim succeeds.
+
+        Used by sessions that aren't best suited for the action, for example because
+        they can't ban in the chat, so a better suited session can claim it first.
+        The waiting happens in its own task and doesn't block the caller.
+
+        Args:
+            action: Name of the action, like the plugin taking it
+            key: The key of the update
+            act: Coroutine function taking the action
+        """
+        asyncio.ensure_future(self._claim_later(action, key, act))
+
+    async def _claim_later(self, action: str, key: Optional[EventKey],
+                           act: Callable[[], Awaitable[None]]) -> None:
+        await asyncio.sleep(self.grace)
+        if self.claim(action, key):
+            try:
+                await act()
+            except Exception:  # pylint: disable = W0703
+                logger.exception('Delayed %s action failed', action)
+
+    @property
+    def shared(self) -> int:
+        """Number of checks that reused the verdict of another session."""
+        return self._verdicts.hits
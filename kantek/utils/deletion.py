@@ -0,0 +1,116 @@
+"""Delete messages in batches instead of one request per message."""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set
+
+import logzero
+from telethon import hints, utils
+from telethon.errors import FloodWaitError, RPCError
+
+if TYPE_CHECKING:
+    from utils.client import KantekClient
+
+try:
+    from config import deletion_window
+except ImportError:
+    deletion_window = 0.5
+
+logger: logging.Logger = logzero.logger
+
+# maximum number of messages Telegram deletes with one request
+CHUNK_SIZE = 100
+
+
+class _Batch:
+    __slots__ = ('chat', 'message_ids', 'done')
+
+    def __init__(self, chat: hints.EntityLike) -> None:
+        self.chat = chat
+        self.message_ids: Set[int] = set()
+        self.done: asyncio.Future = asyncio.get_event_loop().create_future()
+
+
+class DeletionQueue:
+    """Collect the messages to delete per chat and delete them together.
+
+    Messages queued for a chat within `window` seconds are deleted with one
+    request per 100 messages. Flood waits are waited out, other errors are
+    logged and reported through the returned future.
+
+    Attributes:
+        deleted: Number of deleted messages
+        failed: Number of messages that couldn't be deleted
+
+    Args:
+        client: The client deleting the messages
+        window: Seconds to wait for more messages of the same chat
+    """
+
+    def __init__(self, client: 'KantekClient', window: float = deletion_window) -> None:
+        self.window = window
+        self.deleted = 0
+        self.failed = 0
+        self._client = client
+        self._batches: Dict[int, _Batch] = {}
+
+    def delete(self, chat: hints.EntityLike, message_ids: Iterable[int]) -> asyncio.Future:
+        """Queue messages for deletion.
+
+        The returned future doesn't need to be awaited.
+
+        Args:
+            chat: The chat of the messages
+            message_ids: The ids of the messages
+
+        Returns: Future with the ids of the messages that couldn't be deleted
+        """
+        chat_id = chat if isinstance(chat, int) else utils.get_peer_id(chat)
+        batch = self._batches.get(chat_id)
+        if batch is None:
+            batch = self._batches[chat_id] = _Batch(chat)
+            asyncio.ensure_future(self._flush(chat_id, batch))
+        batch.message_ids.update(message_ids)
+        return batch.done
+
+    async def _flush(self, chat_id: int, batch: _Batch) -> None:
+        message_ids: List[int] = []
+        failed: List[int] = []
+        done = 0
+        try:
+            await asyncio.sleep(self.window)
+            # messages queued from now on go into a new batch
+            del self._batches[chat_id]
+            message_ids = sorted(batch.message_ids)
+            for done in range(0, len(message_ids), CHUNK_SIZE):
+                chunk = message_ids[done:done + CHUNK_SIZE]
+                try:
+                    deleted = await self._delete_chunk(batch.chat, chunk)
+                except Exception:  # pylint: disable = W0703
+                    logger.exception('Deleting %s messages in %s failed', len(chunk), batch.chat)
+                    deleted = False
+                if not deleted:
+                    failed.extend(chunk)
+            done = len(message_ids)
+        finally:
+            if self._batches.get(chat_id) is batch:
+                del self._batches[chat_id]
+                message_ids = sorted(batch.message_ids)
+            # chunks that weren't tried because the flush was cancelled count as failed
+            failed.extend(message_ids[done:])
+            self.deleted += len(message_ids) - len(failed)
+            self.failed += len(failed)
+            if not batch.done.done():
+                batch.done.set_result(failed)
+
+    async def _delete_chunk(self, chat: hints.EntityLike, message_ids: List[int]) -> bool:
+        while True:
+            try:
+                await self._client.delete_messages(chat, message_ids)
+                return True
+            except FloodWaitError as err:
+                logger.warning('Waiting %ss before deleting %s messages', err.seconds,
+                               len(message_ids))
+                await asyncio.sleep(err.seconds)
+            except RPCError as err:
+                logger.error('Deleting %s messages in %s failed: %s', len(message_ids), chat, err)
+                return False
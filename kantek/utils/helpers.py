@@ -6,7 +6,8 @@ import logging
 import re
 import urllib
 from io import BytesIO
-from typing import Dict, List, Tuple, Union
+from typing import (AsyncIterable, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple,
+                    TypeVar, Union)
 
 import logzero
 import photohash
@@ -14,15 +15,23 @@ from faker import Faker
 from PIL import Image
 from telethon import utils
 from telethon.events import NewMessage
-from telethon.tl.types import Channel, Chat, User
+from telethon.tl.types import (Channel, Chat, Photo, PhotoCachedSize, PhotoSize,
+                               PhotoStrippedSize, TypePhotoSize, User)
 
-from utils import parsers
+from utils import parsers, workers
 from utils.mdtex import Italic
 
+try:
+    from config import photo_hash_draft_size
+except ImportError:
+    photo_hash_draft_size = None
+
 INVITELINK_PATTERN = re.compile(r'(?:joinchat|join)(?:/|\?invite=)(.*|)')
 
 logger: logging.Logger = logzero.logger
 
+T = TypeVar('T')
+
 
 async def get_full_name(entity: Union[Channel, Chat, User]) -> str:
     """Return first_name + last_name if last_name exists else just first_name
@@ -60,10 +69,27 @@ async def get_args(event: NewMessage.Event) -> Tuple[Dict[str, str], List[str]]:
     Returns:
         Parsed arguments as returned by parser.parse_arguments()
     """
+    # commands get their arguments parsed once by the CommandRouter
+    parsed_args = getattr(event, 'parsed_args', None)
+    if parsed_args is not None:
+        return parsed_args
     _args = event.message.raw_text.split()[1:]
     return parsers.parse_arguments(' '.join(_args))
 
 
+async def get_subcommand_args(event: NewMessage.Event) -> Tuple[Dict[str, str], List[str]]:
+    """Get the arguments following the subcommand of a command
+
+    Args:
+        event: The event
+
+    Returns:
+        Parsed arguments like get_args() without the subcommand
+    """
+    keyword_args, args = await get_args(event)
+    return keyword_args, args[1:]
+
+
 async def rose_csv_to_dict(filename: str) -> List[Dict[str, str]]:
     """Convert a fedban list from Rose to a json that can be imported into MySQLDB
 
@@ -117,8 +143,121 @@ def hash_file(file: bytes):
     return hasher.hexdigest()
 
 
-async def hash_photo(photo):
+async def hash_file_chunks(chunks: AsyncIterable[bytes],
+                           progress_callback: Optional[Callable[[int], None]] = None) -> str:
+    """Hash a file while it is downloaded, giving the same result as hash_file.
+
+    Args:
+        chunks: The file as async iterable of byte chunks, like telethons iter_download
+        progress_callback: Called with the number of bytes hashed so far after every chunk
+
+    Returns: The hex digest
+    """
+    hasher = hashlib.sha512()
+    received = 0
     loop = asyncio.get_event_loop()
+    async for chunk in chunks:
+        # hashlib releases the GIL for large buffers so this doesn't need a process,
+        # the hash object can't be passed to another process anyway
+        await loop.run_in_executor(None, hasher.update, chunk)
+        received += len(chunk)
+        if progress_callback is not None:
+            progress_callback(received)
+    return hasher.hexdigest()
+
+
+def get_photo_thumb(photo: Photo, size: str) -> Optional[TypePhotoSize]:
+    """Select the size of a photo that should be downloaded for hashing.
+
+    Args:
+        photo: The photo
+        size: 'full' for the full photo, 'small' for the smallest thumbnail or
+            'stripped' for the tiny preview embedded in the photo itself
+
+    Returns: The size to pass as thumb to download_media, None for the full photo
+    """
+    if size == 'full':
+        return None
+    if size == 'stripped':
+        for photo_size in photo.sizes:
+            if isinstance(photo_size, PhotoStrippedSize):
+                return photo_size
+    sized = [s for s in photo.sizes if isinstance(s, (PhotoSize, PhotoCachedSize))]
+    if not sized:
+        return None
+    return min(sized, key=lambda s: s.w * s.h)
+
+
+def _hash_photo_bytes(photo: bytes, draft_size: Optional[int]) -> str:
     pil_photo = Image.open(BytesIO(photo))
-    photo_hash = await loop.run_in_executor(None, photohash.average_hash, pil_photo)
-    return str(photo_hash)
+    if draft_size:
+        # let the JPEG decoder scale the photo down by up to 1/8 while decoding,
+        # this is faster but changes some hashes by a few bits
+        pil_photo.draft(pil_photo.mode, (draft_size, draft_size))
+    return str(photohash.average_hash(pil_photo))
+
+
+async def hash_photo(photo, draft_size: Optional[int] = photo_hash_draft_size):
+    """Return the media hash of a photo.
+
+    Opening, decoding and hashing all happen in the hash worker processes.
+
+    Args:
+        photo: The photo as bytes
+        draft_size: Minimum width and height JPEGs are decoded at, None decodes the full photo
+
+    Returns: The average hash as returned by photohash
+    """
+    return await workers.hash_pool.run(_hash_photo_bytes, photo, draft_size)
+
+
+async def first_result(factories: Sequence[Callable[[], Awaitable[T]]],
+                       limit: int) -> Optional[T]:
+    """Run coroutines concurrently and return the first truthy result in their order.
+
+    The result is the same as awaiting them one after another and stopping at
+    the first truthy result. Coroutines after a truthy result are cancelled as
+    soon as it is known, since their results can't be used anymore.
+
+    Args:
+        factories: Callables that return the coroutines to run
+        limit: Maximum number of coroutines running at the same time
+
+    Returns: The first truthy result or None
+    """
+    if not factories:
+        return None
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _run(factory: Callable[[], Awaitable[T]]) -> T:
+        async with semaphore:
+            return await factory()
+
+    tasks = [asyncio.ensure_future(_run(factory)) for factory in factories]
+    next_index = 0
+    try:
+        while next_index < len(tasks):
+            if not tasks[next_index].done():
+                # only wait on running tasks, a finished one would make wait return immediately
+                pending = [task for task in tasks[next_index:] if not task.done()]
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for index in range(next_index, len(tasks)):
+                task = tasks[index]
+                if task.done() and not task.cancelled() and not task.exception() and task.result():
+                    for later_task in tasks[index + 1:]:
+                        later_task.cancel()
+                    break
+            while next_index < len(tasks) and tasks[next_index].done():
+                # raises the exception of a failed coroutine like awaiting it directly would
+                result = tasks[next_index].result()
+                if result:
+                    return result
+                next_index += 1
+        return None
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # mark exceptions of unused results as retrieved
+                task.exception()
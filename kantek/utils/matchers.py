@@ -0,0 +1,339 @@
+"""Matchers that check a value against a whole blacklist at once."""
+from collections import deque
+import json
+from typing import (TYPE_CHECKING, Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple,
+                    Union)
+
+from photohash import hash_distance
+
+from utils.constants import TLD_BLACKLIST_EXCEPTIONS
+
+if TYPE_CHECKING:
+    from database.blacklists import BlacklistSnapshot
+
+# a blacklist mapping or pairs of item and id, which may contain duplicate items
+Blacklist = Union[Mapping[str, int], Iterable[Tuple[str, int]]]
+
+# shared by all nodes without children to save memory
+_NO_CHILDREN: Dict[str, int] = {}
+
+
+class _RankedMatcher:
+    """Base class for matchers that report matches by their blacklist rank.
+
+    The rank is the position of an item in the blacklist. The lowest rank is
+    the item a loop over the blacklist would have found first.
+
+    Args:
+        blacklist: A blacklist snapshot or pairs of item and id
+    """
+
+    def __init__(self, blacklist: Blacklist) -> None:
+        items = blacklist.items() if isinstance(blacklist, Mapping) else blacklist
+        self._strings: List[str] = []
+        self._values: List[int] = []
+        for string, value in items:
+            self._strings.append(string)
+            self._values.append(value)
+
+    def search(self, *args: Any) -> Set[int]:
+        raise NotImplementedError
+
+    def search_values(self, *args: Any) -> Set[int]:
+        """Return the ids of all matching blacklist items.
+
+        Args:
+            *args: Same as search
+
+        Returns: Set of ids
+        """
+        return {self._values[rank] for rank in self.search(*args)}
+
+    def first(self, *args: Any) -> Optional[Tuple[str, int]]:
+        """Return the first matching blacklist item.
+
+        Args:
+            *args: Same as search
+
+        Returns: The item and its blacklist id or None
+        """
+        ranks = self.search(*args)
+        return self._item(min(ranks)) if ranks else None
+
+    def last(self, *args: Any) -> Optional[Tuple[str, int]]:
+        """Return the last matching blacklist item.
+
+        Args:
+            *args: Same as search
+
+        Returns: The item and its blacklist id or None
+        """
+        ranks = self.search(*args)
+        return self._item(max(ranks)) if ranks else None
+
+    def _item(self, rank: int) -> Tuple[str, int]:
+        return self._strings[rank], self._values[rank]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class AhoCorasick(_RankedMatcher):
+    """Aho-Corasick automaton over the strings of a blacklist.
+
+    Finds every blacklisted string contained in a text in a single pass,
+    independent of the number of strings in the blacklist.
+    """
+
+    def __init__(self, blacklist: Blacklist) -> None:
+        super().__init__(blacklist)
+        self._goto: List[Dict[str, int]] = [_NO_CHILDREN]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        # nearest node on the fail chain that has an output
+        self._output_link: List[int] = [0]
+        self._always: List[int] = []
+
+        for rank, string in enumerate(self._strings):
+            if not string:
+                # an empty string is contained in every text
+                self._always.append(rank)
+                continue
+            node = 0
+            for char in string:
+                children = self._goto[node]
+                child = children.get(char)
+                if child is None:
+                    if children is _NO_CHILDREN:
+                        children = self._goto[node] = {}
+                    child = children[char] = len(self._goto)
+                    self._goto.append(_NO_CHILDREN)
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._output_link.append(0)
+                node = child
+            self._output[node] += (rank,)
+        self._build_links()
+
+    def _build_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail if fail != child else 0
+                fail = self._fail[child]
+                self._output_link[child] = fail if self._output[fail] else self._output_link[fail]
+
+    def search(self, text: str) -> Set[int]:
+        """Return the ranks of all strings contained in a text.
+
+        Args:
+            text: The text to scan
+
+        Returns: Set of ranks
+        """
+        found: Set[int] = set(self._always)
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        output_link = self._output_link
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match = node if output[node] else output_link[node]
+            while match:
+                found.update(output[match])
+                match = output_link[match]
+        return found
+
+
+class _BKNode:
+    __slots__ = ('hash', 'ranks', 'children')
+
+    def __init__(self, _hash: str, rank: int) -> None:
+        self.hash = _hash
+        self.ranks = [rank]
+        self.children: Dict[int, '_BKNode'] = {}
+
+
+class BKTree(_RankedMatcher):
+    """BK-tree over the hashes of the media hash blacklist.
+
+    Uses the same distance as `photohash.hashes_are_similar` so results are
+    identical to comparing against every hash, but a search with a small
+    tolerance only visits a fraction of the tree.
+    """
+
+    def __init__(self, blacklist: Blacklist) -> None:
+        super().__init__(blacklist)
+        # photohash can only compare hashes of the same length
+        self._roots: Dict[int, _BKNode] = {}
+        for rank, _hash in enumerate(self._strings):
+            self._add(_hash, rank)
+
+    def _add(self, _hash: str, rank: int) -> None:
+        node = self._roots.get(len(_hash))
+        if node is None:
+            self._roots[len(_hash)] = _BKNode(_hash, rank)
+            return
+        while True:
+            distance = hash_distance(_hash, node.hash)
+            if distance == 0:
+                node.ranks.append(rank)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BKNode(_hash, rank)
+                return
+            node = child
+
+    def search(self, _hash: str, tolerance: int) -> Set[int]:
+        """Return the ranks of all hashes within a distance of a hash.
+
+        Args:
+            _hash: The media hash
+            tolerance: Maximum distance as understood by photohash
+
+        Returns: Set of ranks
+        """
+        found: Set[int] = set()
+        root = self._roots.get(len(_hash))
+        stack = [root] if root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hash_distance(_hash, node.hash)
+            if distance <= tolerance:
+                found.update(node.ranks)
+            for child_distance, child in node.children.items():
+                if distance - tolerance <= child_distance <= distance + tolerance:
+                    stack.append(child)
+        return found
+
+
+class _DomainNode:
+    __slots__ = ('children', 'domain', 'tld')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, '_DomainNode'] = {}
+        self.domain: Optional[int] = None
+        self.tld: Optional[int] = None
+
+
+class DomainTrie:
+    """Trie of blacklisted domains and top level domains keyed by reversed labels.
+
+    `sub.spam.example.com` is looked up as `com -> example -> spam -> sub`,
+    so one walk over the labels of a host finds the blacklisted domain itself,
+    any blacklisted parent domain and a blacklisted top level domain.
+
+    Args:
+        domains: The domain blacklist
+        tlds: The top level domain blacklist
+        exceptions: Second level labels that never match a blacklisted tld,
+            like the `nic` of registry sites
+    """
+
+    def __init__(self, domains: 'BlacklistSnapshot', tlds: 'BlacklistSnapshot',
+                 exceptions: Iterable[str] = TLD_BLACKLIST_EXCEPTIONS) -> None:
+        self._domain_type = domains.hex_type
+        self._tld_type = tlds.hex_type
+        self._exceptions = set(exceptions)
+        self._root = _DomainNode()
+        for domain, _id in domains.items():
+            self._insert(str(domain)).domain = _id
+        for tld, _id in tlds.items():
+            node = self._insert(str(tld))
+            if node.tld is None:
+                node.tld = _id
+
+    def _insert(self, domain: str) -> _DomainNode:
+        node = self._root
+        for label in reversed(domain.lower().strip('.').split('.')):
+            node = node.children.setdefault(label, _DomainNode())
+        return node
+
+    def match(self, host: str) -> Optional[Tuple[str, int]]:
+        """Check a host against the domain and tld blacklist.
+
+        The most specific blacklisted domain wins, top level domains are only
+        reported if no domain matched.
+
+        Args:
+            host: A domain or the netloc of a url
+
+        Returns: The hex type of the matching blacklist and the item id or None
+        """
+        labels = self._labels(host)
+        if not labels:
+            return None
+        tld_match = None
+        domain_match = None
+        node = self._root
+        for depth, label in enumerate(labels):
+            child = node.children.get(label)
+            if child is None:
+                break
+            node = child
+            if depth == 0 and node.tld is not None and len(labels) > 1:
+                if labels[1] not in self._exceptions:
+                    tld_match = (self._tld_type, node.tld)
+            if node.domain is not None:
+                domain_match = (self._domain_type, node.domain)
+        return domain_match or tld_match
+
+    @staticmethod
+    def _labels(host: str) -> List[str]:
+        # strip credentials and port of a netloc
+        host = host.rsplit('@', 1)[-1].split(':')[0]
+        host = host.lower().strip('.')
+        return list(reversed(host.split('.'))) if host else []
+
+
+class LinkPreviewIndex:
+    """Link preview rules grouped by the domain they apply to.
+
+    Every rule of the link preview blacklist is a JSON document with a list
+    of `domains` or `null` for all domains and a `string` that has to be in
+    the title or description of the preview. The rules are parsed once and
+    every group gets its own Aho-Corasick automaton, so checking a preview
+    only scans the rules for its domain and the global ones.
+    """
+
+    def __init__(self, blacklist: 'BlacklistSnapshot') -> None:
+        self._ids: List[int] = []
+        groups: Dict[Optional[str], List[Tuple[str, int]]] = {}
+        for rank, (item, _id) in enumerate(blacklist.items()):
+            self._ids.append(_id)
+            rule = json.loads(item)
+            domains = rule['domains']
+            if isinstance(domains, str):
+                domains = [domains]
+            for domain in (domains if domains is not None else [None]):
+                group = groups.setdefault(domain if domain is None else str(domain), [])
+                group.append((rule['string'], rank))
+        self._groups: Dict[Optional[str], AhoCorasick] = {
+            domain: AhoCorasick(rules) for domain, rules in groups.items()}
+
+    def match(self, domain: str, title: str, description: str) -> Optional[int]:
+        """Check a link preview against the rules for its domain.
+
+        Args:
+            domain: The netloc of the previewed url
+            title: The lowercased title of the preview
+            description: The lowercased description of the preview
+
+        Returns: The id of the first matching rule or None
+        """
+        ranks: Set[int] = set()
+        for group in (self._groups.get(domain), self._groups.get(None)):
+            if group is not None:
+                for text in (title, description):
+                    ranks.update(group.search_values(text))
+        return self._ids[min(ranks)] if ranks else None
@@ -0,0 +1,154 @@
+"""Run a series of checks cheapest first until one of them returns a verdict."""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+import logzero
+
+logger: logging.Logger = logzero.logger
+
+V = TypeVar('V')
+Check = Callable[[Any], Awaitable[Optional[V]]]
+
+# every pipeline by name, to show their timings
+pipelines: Dict[str, 'Pipeline'] = {}
+
+
+class Cost(IntEnum):
+    """How expensive a check is, stages run in this order."""
+    MEMORY = 0
+    LOCAL = 1
+    NETWORK = 2
+    DOWNLOAD = 3
+
+
+@dataclass
+class Stage(Generic[V]):
+    """A single check of a pipeline.
+
+    Attributes:
+        name: Name used for the timings
+        cost: The cost class of the check
+        check: Coroutine function that takes the subject and returns a verdict or None
+    """
+    name: str
+    cost: Cost
+    check: Check
+
+
+@dataclass
+class StageTiming:
+    """Timings of one stage.
+
+    Attributes:
+        runs: Number of times the stage ran
+        hits: Number of times the stage returned a verdict
+        total: Total seconds spent in the stage
+        max: Longest run in seconds
+    """
+    runs: int = 0
+    hits: int = 0
+    total: float = 0
+    max: float = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.runs if self.runs else 0
+
+
+class Pipeline(Generic[V]):
+    """Stages ordered by their cost that short circuit on the first verdict.
+
+    Stages of the same cost run in the order they were added. Every run gets
+    a time budget, a stage still running when it's used up is cancelled and
+    the remaining limited stages are skipped. Stages of the `unlimited` cost or
+    higher aren't limited by the budget and run even after it's used up, so
+    downloads that take longer can finish and be cached instead of being
+    cancelled and retried on the next message.
+
+    Args:
+        name: Name used in log messages
+        budget: Seconds the limited stages of a single run may take, None for no limit
+        unlimited: Cost from which on stages aren't limited, None to limit all stages
+    """
+
+    def __init__(self, name: str, budget: Optional[float] = None,
+                 unlimited: Optional[Cost] = Cost.DOWNLOAD) -> None:
+        self.name = name
+        self.budget = budget
+        self.unlimited = unlimited
+        self.stages: List[Stage] = []
+        self.timings: Dict[str, StageTiming] = {}
+        self.timeouts = 0
+        pipelines[name] = self
+
+    def add(self, stage: Stage) -> None:
+        """Add a stage, keeping the stages sorted by cost."""
+        self.stages.append(stage)
+        self.stages.sort(key=lambda s: s.cost)
+        self.timings.setdefault(stage.name, StageTiming())
+
+    def stage(self, cost: Cost, name: Optional[str] = None) -> Callable[[Check], Check]:
+        """Decorator to add a coroutine function as stage.
+
+        Args:
+            cost: The cost class of the check
+            name: Name of the stage, defaults to the name of the function
+
+        Returns: The unchanged function
+        """
+
+        def decorator(check: Check) -> Check:
+            self.add(Stage(name or check.__name__.strip('_'), cost, check))
+            return check
+
+        return decorator
+
+    async def run(self, subject: Any) -> Optional[V]:
+        """Run the stages until one returns a verdict.
+
+        Args:
+            subject: The object passed to every stage
+
+        Returns: The first verdict or None
+        """
+        deadline = None if self.budget is None else time.monotonic() + self.budget
+        timed_out = False
+        for stage in self.stages:
+            timeout = None
+            if deadline is not None and (self.unlimited is None or stage.cost < self.unlimited):
+                if timed_out:
+                    continue
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    self._timed_out(stage)
+                    timed_out = True
+                    continue
+            start = time.monotonic()
+            try:
+                verdict: Optional[V] = await asyncio.wait_for(stage.check(subject), timeout)
+            except asyncio.TimeoutError:
+                self._record(stage, start, None)
+                self._timed_out(stage)
+                timed_out = True
+                continue
+            self._record(stage, start, verdict)
+            if verdict:
+                return verdict
+        return None
+
+    def _record(self, stage: Stage, start: float, verdict: Optional[V]) -> None:
+        elapsed = time.monotonic() - start
+        timing = self.timings[stage.name]
+        timing.runs += 1
+        timing.total += elapsed
+        timing.max = max(timing.max, elapsed)
+        if verdict:
+            timing.hits += 1
+
+    def _timed_out(self, stage: Stage) -> None:
+        self.timeouts += 1
+        logger.warning('%s ran out of its %ss budget at %s', self.name, self.budget, stage.name)
@@ -11,9 +11,11 @@ from typing import Callable, Dict, List, Optional, Tuple
 import logzero
 from telethon import TelegramClient
 
+from utils.router import CommandRouter, get_command
+
 logger: Logger = logzero.logger
 
-__version__ = '0.1.0'
+__version__ = '0.2.0'
 
 
 @dataclass
@@ -65,6 +67,7 @@ class PluginManager:
         self.client = client
         self.active_plugins: List[Plugin] = []
         self.plugin_path: str = os.path.abspath('./plugins')
+        self.router = CommandRouter(client)
 
     def register_all(self) -> List[Plugin]:
         """Get a list of all plugins and register them with the client.
@@ -79,7 +82,7 @@ class PluginManager:
                 logger.debug('Registered plugin %s/%s',
                              self._get_plugin_location(path), callback.name)
                 active_commands.append(callback)
-                self.client.add_event_handler(callback.callback)
+                self._add_callback(callback)
             self.active_plugins.append(
                 Plugin(plugin_name,
                        active_commands,
@@ -115,9 +118,20 @@ class PluginManager:
 
         """
         for callback in plugin.callbacks:
-            logger.debug(self.client.remove_event_handler(callback.callback))
+            cmd = get_command(callback.callback)
+            if cmd is not None:
+                self.router.remove(cmd)
+            else:
+                logger.debug(self.client.remove_event_handler(callback.callback))
         self.active_plugins.remove(plugin)
 
+    def _add_callback(self, callback: Callback) -> None:
+        cmd = get_command(callback.callback)
+        if cmd is not None:
+            self.router.add(cmd)
+        else:
+            self.client.add_event_handler(callback.callback)
+
     def _get_plugin_location(self, path: str) -> str:
         return (os.path.relpath(path, self.plugin_path)
                 .rstrip('.py')
@@ -143,8 +157,11 @@ class PluginManager:
             tree = ast.parse(f.read())
             for item in tree.body:
                 if isinstance(item, ast.AsyncFunctionDef) and not item.name.startswith('_'):
-                    is_private = self.__is_private(self.__get_event_decorator_keywords(item))
-                    callbacks.append(Callback(item.name, getattr(module, item.name), is_private))
+                    callback = getattr(module, item.name)
+                    # commands only react to outgoing messages
+                    is_private = (get_command(callback) is not None
+                                  or self.__is_private(self.__get_event_decorator_keywords(item)))
+                    callbacks.append(Callback(item.name, callback, is_private))
         return callbacks
 
     @staticmethod
@@ -174,6 +191,8 @@ class PluginManager:
     def __get_event_decorator_keywords(cls, func: ast.AsyncFunctionDef) -> Dict[str, bool]:
         keywords = {}
         for decorator in func.decorator_list:
+            if not isinstance(decorator, ast.Call) or not isinstance(decorator.func, ast.Attribute):
+                continue
             if decorator.func.value.id == 'events':
                 keywords.update(cls.__get_keywords(decorator))
         return keywords
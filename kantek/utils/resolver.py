@@ -0,0 +1,134 @@
+"""Follow url redirects without downloading the response bodies."""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import logzero
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout, TCPConnector
+from yarl import URL
+
+logger: logging.Logger = logzero.logger
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# servers that don't implement HEAD properly
+HEAD_FALLBACK_STATUSES = {400, 403, 404, 405, 501}
+
+
+@dataclass
+class ResolvedUrl:
+    """The result of following a url.
+
+    Attributes:
+        url: The url after following all redirects
+        chain: Every url that was visited, starting with the original one
+        base_domain: The host of the final url without subdomains
+    """
+    url: str
+    chain: List[str]
+    base_domain: str
+
+
+def get_base_domain(host: str) -> str:
+    """Strip the subdomains of a host.
+
+    >>> get_base_domain('www.sitischu.com')
+    'sitischu.com'
+
+    >>> get_base_domain('localhost')
+    'localhost'
+
+    Args:
+        host: The host
+
+    Returns: The base domain
+    """
+    return host.split('.', maxsplit=host.count('.') - 1)[-1] or host
+
+
+class RedirectResolver:
+    """Follow redirects hop by hop using HEAD requests.
+
+    Falls back to GET for servers that don't answer or drop HEAD requests but
+    never reads a response body. Connections are kept alive and DNS results are cached by
+    a dedicated connector, which also limits the connections to a single host.
+
+    Args:
+        max_redirects: Maximum number of redirects to follow
+        per_host_limit: Maximum concurrent connections to the same host
+        hop_timeout: Timeout in seconds for connecting and reading headers of one hop
+        total_timeout: Timeout in seconds for following the whole chain
+        dns_ttl: Seconds DNS results are cached
+    """
+
+    def __init__(self, max_redirects: int = 10, per_host_limit: int = 4,
+                 hop_timeout: float = 2, total_timeout: float = 5, dns_ttl: int = 300) -> None:
+        self.max_redirects = max_redirects
+        self.per_host_limit = per_host_limit
+        self.hop_timeout = hop_timeout
+        self.total_timeout = total_timeout
+        self.dns_ttl = dns_ttl
+        self._session: Optional[ClientSession] = None
+
+    def _get_session(self) -> ClientSession:
+        # created lazily since the session has to be created inside the event loop
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(limit=100, limit_per_host=self.per_host_limit,
+                                     ttl_dns_cache=self.dns_ttl, use_dns_cache=True,
+                                     keepalive_timeout=30)
+            timeout = ClientTimeout(total=None, sock_connect=self.hop_timeout,
+                                    sock_read=self.hop_timeout)
+            self._session = ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def resolve(self, url: str, headers: Optional[Dict[str, str]] = None) -> ResolvedUrl:
+        """Follow the redirects of a url.
+
+        Args:
+            url: The url, http:// is assumed if it has no scheme
+            headers: Headers sent with every request
+
+        Returns: The resolved url with the redirect chain
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: If a hop fails
+        """
+        if not url.startswith('http'):
+            url = f'http://{url}'
+        return await asyncio.wait_for(self._follow(URL(url), headers or {}), self.total_timeout)
+
+    async def _follow(self, url: URL, headers: Dict[str, str]) -> ResolvedUrl:
+        chain = [str(url)]
+        for _ in range(self.max_redirects):
+            location = await self._hop(url, headers)
+            if location is None:
+                break
+            url = url.join(URL(location))
+            chain.append(str(url))
+        else:
+            logger.warning('Stopped following %s after %s redirects', chain[0], self.max_redirects)
+        return ResolvedUrl(str(url), chain, get_base_domain(url.host or ''))
+
+    async def _hop(self, url: URL, headers: Dict[str, str]) -> Optional[str]:
+        session = self._get_session()
+        try:
+            async with session.head(url, headers=headers, allow_redirects=False) as response:
+                if response.status not in HEAD_FALLBACK_STATUSES:
+                    return self._location(response)
+        except ClientError as err:
+            # some servers drop or reset HEAD requests instead of answering them
+            logger.debug('HEAD request to %s failed, retrying with GET: %s', url, err)
+        # the body is never read, leaving the context closes the connection instead
+        async with session.get(url, headers=headers, allow_redirects=False) as response:
+            return self._location(response)
+
+    @staticmethod
+    def _location(response: ClientResponse) -> Optional[str]:
+        if response.status in REDIRECT_STATUSES:
+            return response.headers.get('Location')
+        return None
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        if self._session is not None:
+            await self._session.close()
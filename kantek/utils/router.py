@@ -0,0 +1,90 @@
+"""Dispatch all commands from a single event handler."""
+import re
+from dataclasses import dataclass
+from logging import Logger
+from typing import Callable, Dict, Optional, Tuple
+
+import logzero
+from telethon import TelegramClient, events
+from telethon.events import NewMessage
+
+from config import cmd_prefix
+from utils import parsers
+
+logger: Logger = logzero.logger
+
+COMMAND_PATTERN = re.compile(rf'(?:{cmd_prefix})(\S+)')
+# attribute of a callback holding its Command
+COMMAND_ATTRIBUTE = '_kantek_command'
+
+
+@dataclass
+class Command:
+    """A command and its aliases.
+
+    Attributes:
+        names: The name and aliases without the command prefix
+        callback: Coroutine function that is called with the NewMessage event
+    """
+    names: Tuple[str, ...]
+    callback: Callable
+
+
+def command(*names: str) -> Callable[[Callable], Callable]:
+    """Decorator to mark a plugin function as command.
+
+    The plugin manager registers it with the CommandRouter instead of as event handler.
+
+    Args:
+        *names: The name of the command followed by its aliases, without the prefix
+
+    Returns: The unchanged function
+    """
+
+    def decorator(callback: Callable) -> Callable:
+        setattr(callback, COMMAND_ATTRIBUTE, Command(names, callback))
+        return callback
+
+    return decorator
+
+
+def get_command(callback: Callable) -> Optional[Command]:
+    """Return the Command of a callback or None if it isn't a command."""
+    return getattr(callback, COMMAND_ATTRIBUTE, None)
+
+
+class CommandRouter:
+    """Look up the command of every outgoing message by its name.
+
+    Instead of one regex per command only the prefix is matched once and the
+    command is found with a dict lookup. The arguments are parsed once before
+    calling the command and reused by `helpers.get_args`.
+    """
+
+    def __init__(self, client: TelegramClient) -> None:
+        self._commands: Dict[str, Command] = {}
+        client.add_event_handler(self._dispatch, events.NewMessage(outgoing=True))
+
+    def add(self, cmd: Command) -> None:
+        """Register a command under all its names."""
+        for name in cmd.names:
+            if name in self._commands:
+                logger.warning('Command %s is registered twice', name)
+            self._commands[name] = cmd
+
+    def remove(self, cmd: Command) -> None:
+        """Unregister a command."""
+        for name in cmd.names:
+            if self._commands.get(name) is cmd:
+                del self._commands[name]
+
+    async def _dispatch(self, event: NewMessage.Event) -> None:
+        match = COMMAND_PATTERN.match(event.message.raw_text)
+        if match is None:
+            return
+        cmd = self._commands.get(match.group(1))
+        if cmd is None:
+            return
+        _args = event.message.raw_text[match.end():].split()
+        event.parsed_args = parsers.parse_arguments(' '.join(_args))
+        await cmd.callback(event)
@@ -0,0 +1,192 @@
+"""Run the work of automatic plugins with a fixed number of workers."""
+import asyncio
+import functools
+import logging
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+import logzero
+
+try:
+    from config import scheduler_workers
+except ImportError:
+    scheduler_workers = 16
+
+try:
+    from config import scheduler_queue_size
+except ImportError:
+    scheduler_queue_size = 1000
+
+try:
+    from config import scheduler_shedding
+except ImportError:
+    scheduler_shedding = 'oldest'
+
+logger: logging.Logger = logzero.logger
+
+Job = Callable[[], Awaitable[None]]
+
+
+class Priority(IntEnum):
+    """Jobs with a lower value run first."""
+    JOIN = 0
+    BANLIST = 1
+    CONTENT = 2
+
+
+class Scheduler:
+    """A bounded queue of jobs that is worked on by a fixed number of workers.
+
+    Jobs run by priority. Within a priority every chat takes turns, so a chat
+    that is being raided can't starve the others.
+
+    When the queue is full a job is shed according to the shedding policy:
+    `oldest` drops the oldest job of the chat with the most queued jobs in the
+    least important priority, unless every queued job is more important than
+    the new one. `newest` drops the new job.
+
+    Args:
+        workers: Number of jobs that run at the same time
+        max_queued: Maximum number of waiting jobs
+        shedding: 'oldest' or 'newest'
+    """
+
+    def __init__(self, workers: int = 16, max_queued: int = 1000,
+                 shedding: str = 'oldest') -> None:
+        if shedding not in ('oldest', 'newest'):
+            raise ValueError(f'Unknown shedding policy {shedding}')
+        self.workers = workers
+        self.max_queued = max_queued
+        self.shedding = shedding
+        self._queues: Dict[Priority, 'OrderedDict[Hashable, Deque[Job]]'] = {
+            priority: OrderedDict() for priority in Priority}
+        self._depths: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self.dropped: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self.processed = 0
+        self.peak_depth = 0
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        """Number of waiting jobs."""
+        return sum(self._depths.values())
+
+    def depths(self) -> Dict[Priority, int]:
+        """Number of waiting jobs per priority."""
+        return dict(self._depths)
+
+    def submit(self, priority: Priority, chat_id: Hashable, job: Job) -> bool:
+        """Queue a job.
+
+        Args:
+            priority: The priority of the job
+            chat_id: The chat the job belongs to
+            job: Coroutine function without arguments
+
+        Returns: False if the job was shed
+        """
+        ready = self._start()
+        if self.depth >= self.max_queued and not self._shed(priority):
+            self.dropped[priority] += 1
+            return False
+        self._queues[priority].setdefault(chat_id, deque()).append(job)
+        self._depths[priority] += 1
+        self.peak_depth = max(self.peak_depth, self.depth)
+        ready.release()
+        return True
+
+    def _shed(self, priority: Priority) -> bool:
+        if self.shedding == 'newest':
+            return False
+        for victim in reversed(Priority):
+            if victim < priority:
+                return False
+            chats = self._queues[victim]
+            if chats:
+                chat_id = max(chats, key=lambda c: len(chats[c]))
+                jobs = chats[chat_id]
+                jobs.popleft()
+                if not jobs:
+                    del chats[chat_id]
+                self._depths[victim] -= 1
+                self.dropped[victim] += 1
+                # the worker woken for the dropped job finds the queue one job short
+                return True
+        return False
+
+    def _next(self) -> Job:
+        for priority in Priority:
+            chats = self._queues[priority]
+            if chats:
+                chat_id, jobs = next(iter(chats.items()))
+                job = jobs.popleft()
+                if jobs:
+                    chats.move_to_end(chat_id)
+                else:
+                    del chats[chat_id]
+                self._depths[priority] -= 1
+                return job
+        raise LookupError('No job queued')
+
+    def _start(self) -> asyncio.Semaphore:
+        # started lazily since the tasks need the running event loop
+        if self._ready is None:
+            self._ready = asyncio.Semaphore(0)
+            self._tasks = [asyncio.ensure_future(self._work(self._ready))
+                           for _ in range(self.workers)]
+        return self._ready
+
+    async def _work(self, ready: asyncio.Semaphore) -> None:
+        while True:
+            await ready.acquire()
+            try:
+                job = self._next()
+            except LookupError:
+                # the job was shed after it was announced
+                continue
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pylint: disable = W0703
+                logger.exception('Scheduled job failed')
+            self.processed += 1
+
+    def stop(self) -> None:
+        """Cancel all workers, queued jobs are discarded."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._ready = None
+        for priority in Priority:
+            self._queues[priority].clear()
+            self._depths[priority] = 0
+
+
+# shared by all sessions of this process
+scheduler = Scheduler(scheduler_workers, scheduler_queue_size, scheduler_shedding)
+
+
+def scheduled(priority: Priority) -> Callable:
+    """Decorator to run an event handler through the scheduler.
+
+    The handler returns right after queueing the event, so it has to be
+    applied below `events.register`.
+
+    Args:
+        priority: The priority of the handler
+
+    Returns: The wrapped handler
+    """
+
+    def decorator(handler: Callable[..., Awaitable[None]]) -> Callable[..., Awaitable[None]]:
+        @functools.wraps(handler)
+        async def wrapper(event: Any, *args: Any, **kwargs: Any) -> None:
+            scheduler.submit(priority, event.chat_id,
+                             functools.partial(handler, event, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
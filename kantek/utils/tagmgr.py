@@ -1,5 +1,3 @@
-import asyncio
-import json
 from typing import Optional, Union
 
 from telethon.events import NewMessage
@@ -80,9 +78,4 @@ class TagManager:
         await self._save()
 
     async def _save(self):
-        tags = json.dumps(self.tags)
-        named_tags = json.dumps(self.named_tags)
-
-        sql = 'update `chats` set `tags` = %s, `named_tags` = %s where `id` = %s'
-        await self._db.execute(sql, tags, named_tags, self.chat_id)
-        await self._db.save()
+        await self._collection.update_tags(self.chat_id, self.tags, self.named_tags)
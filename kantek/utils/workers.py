@@ -0,0 +1,84 @@
+"""Process pool for CPU bound work like hashing photos."""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+import logzero
+
+try:
+    from config import hash_workers
+except ImportError:
+    hash_workers = None
+
+try:
+    from config import hash_queue_size
+except ImportError:
+    hash_queue_size = 64
+
+logger: logging.Logger = logzero.logger
+
+T = TypeVar('T')
+
+# the pool is started while threads are running, forking then could copy locks held by them
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class WorkerPool:
+    """A process pool that is only started when it's first used.
+
+    At most `max_pending` jobs are submitted at once, callers above that wait
+    until a slot is free so a burst of work can't queue up unbounded. The
+    processes are started with `START_METHOD`, so the functions are imported
+    again in them instead of being inherited.
+
+    Args:
+        max_workers: Number of processes, defaults to the number of CPUs
+        max_pending: Maximum number of submitted jobs
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 64) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a function in a worker process.
+
+        Args:
+            func: A module level function, it and its arguments have to be picklable
+            *args: Arguments for the function
+
+        Returns: The return value of the function
+        """
+        if self._executor is None or self._slots is None:
+            logger.debug('Starting worker pool with %s processes', self.max_workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context(START_METHOD))
+            self._slots = asyncio.Semaphore(self.max_pending)
+        executor, slots = self._executor, self._slots
+        async with slots:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(executor, func, *args)
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs currently submitted."""
+        if self._slots is None:
+            return 0
+        # pylint: disable = W0212
+        return self.max_pending - self._slots._value
+
+    def shutdown(self) -> None:
+        """Stop all worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._slots = None
+
+
+# shared by all sessions of this process
+hash_pool = WorkerPool(hash_workers, hash_queue_size)